@@ -2,8 +2,20 @@ import copy
 import sys
 import random
 import time
-import heapq
 import traceback
+import array
+import collections
+import mmap
+import json
+import os
+import tracemalloc
+import cProfile
+import pstats
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
+import atexit
+import sqlite3
 
 initial_state = {
     'player1': {'position': (2, 0), 'orientation': 'W'},
@@ -20,17 +32,49 @@ global_vars = {
     'execution_times': [],
     'game_mode': 'PvP',
     'depth': 3, # The max depth for the minimax algorithm
+    'movetime': None, # If set, search by iterative deepening for this many milliseconds per move instead of to a fixed depth
+    'deadline': None, # time.time() at which the current iterative deepening search stops
     
     'nodes_evaluated': 0,
 
     'debug': False, # If true, then allows all debug statements to be printed.
 
-    'priorityq': False,
+    'priorityq': True, # Order moves by transposition table move, killer moves and history heuristic
+    'killers': {},
+    'history': {},
+    'l_history': {},
+
+    'engine': 'dict', # 'dict' or 'bitboard', the state representation used by the minimax search
 
     'stepbystep': False,
 
-    'visited' : set(),
-    'cache': {},
+    'stats': None, # SearchStats filled in by minimax(), when set
+    'stats_json': None, # --stats-json file to append each search's stats to
+    'profile': None, # --profile directory for each computer search's .pstats file
+    'profile_stats': None, # pstats.Stats combining the game's profiled searches
+
+    'benchmark_threshold': 0.25, # --benchmark fails if a time or peak memory is this much worse than the baseline, see --threshold
+    'benchmark_runs': 3, # A benchmark that looks worse than the baseline is judged by the median of this many runs
+
+    'tablebase': None, # Solved positions loaded with --tablebase, the computer plays from it instead of searching
+    'book': None, # Opening book loaded with --book, see load_book()
+
+    'threads': 1, # --threads worker processes for the fixed depth search, split at the root
+    'search_pool': None, # The --threads ProcessPoolExecutor, started on first use
+    'shared_bound': None, # multiprocessing.Value holding the best root score found by any worker
+    'search_id': 0, # Counts parallel searches, so workers know when to reset move ordering
+
+    'tt_age': 0, # Moves on with every search, so entries from earlier moves can be replaced
+    'tt_aging': True, # False in workers playing their own games into a shared table, whose ages don't agree
+    'tt_stats': None, # Transposition table probes, hits, stores and evictions, see tt_report()
+    'tt_shared': None, # SharedMemory holding the transposition table, when worker processes share it
+    'tt_size': 2 ** 16, # Max number of transposition table entries
+    'cache_file': None, # --cache-file keeping search results between runs, see cache_load()
+    'cache_min_depth': 2, # Only results searched at least this deep are looked up in or written to the cache file
+    'cache_batch': 4096, # Max number of results held in memory before they are written to the cache file
+    'cache_db': None, # SQLite connection to the cache file, once opened
+    'cache_pending': None, # Results not written to the cache file yet, by key
+    'tt': None, # Transposition table, see tt_store()
 }
 
 orientations = {
@@ -108,238 +152,267 @@ def getSecondaryOrientation(position, orientation):
         
     return secondary_orient
 
-def getLegalActions(state):
+def square_bit(x, y):
     """
-    Returns all possible valid moves a player can make in the current game state.
-    Each move is represented as a tuple: ((player_pos), 'Orientation', (oldNeutralPos), (newNeutralPos)).
+    Returns the bitmask of square (x, y). Square (x, y) is bit y * 4 + x.
     """
+    return 1 << (y * 4 + x)
 
-    # Get current player's data
-    player = state['turn']
-    player_key = 'player1' if player == 1 else 'player2'
-    other_player_key = 'player2' if player == 1 else 'player1'
-    player_pos = state[player_key]['position']
-    player_orient = state[player_key]['orientation']
-    neutral1_pos = state['neutral'][0]
-    neutral2_pos = state['neutral'][1]
-    player_secondary_orient = getSecondaryOrientation(player_pos, player_orient)
-
-    # Remove the current player's piece from the board (as they are "picking it up")
-    state['bypass_player'] = player_key
-
-    board = buildBoard(state)
-    legal_actions = set()
-    orientations = ['N', 'E', 'S', 'W']
-
-    # Generate all possible L-piece moves
+def buildLPlacements():
+    """
+    Builds the table of every in-bounds L placement. There are 48 of them.
+    Each entry is (mask of the 4 squares covered, (position, orientation) action key, secondary orientation)
+    """
+    placements = []
     for x in range(4):
         for y in range(4):
-            for orient in orientations:
-                
-                if (x == player_pos[0] and y == player_pos[1] and orient == player_orient):
-                    # Edge case: Can't place piece in the same spot as it was originally at
-                    continue
-
-                if isValidLMove((x, y), orient, board):
-                    # Make a state with the new move
-                    copied_state = copy.deepcopy(state)
-                    copied_state[player_key]['position'] = x, y
-                    copied_state[player_key]['orientation'] = orient
-                    copied_state['bypass_player'] = None
-
-                    new_board = buildBoard(copied_state)
-                    new_secondary_orient = getSecondaryOrientation((x,y), orient)
-
-                    # Get all possible neutral piece moves for each neutral piece
-                    neutral_moves_1 = getNeutralMoves(new_board, neutral1_pos)
-                    neutral_moves_2 = getNeutralMoves(new_board, neutral2_pos)
-                    for oldpos, newpos in neutral_moves_1:
-                        # Special format for when a neutral piece is not moved
-                        if oldpos == newpos:
-                            legal_actions.add(((x, y), orient, None, None))
-                        else:
-                            legal_actions.add(((x, y), orient, oldpos, newpos))
-                    for oldpos, newpos in neutral_moves_2:
-                        if oldpos == newpos:
-                            legal_actions.add(((x, y), orient, None, None))
-                        else:
-                            legal_actions.add(((x, y), orient, oldpos, newpos))
-    state['bypass_player'] = None
+            for orient in ['N', 'E', 'S', 'W']:
+                secondary_orient = getSecondaryOrientation((x, y), orient)
+                mask = 0
+                for rx, ry in orientations[orient][secondary_orient]:
+                    cx, cy = x + rx, y + ry
+                    if not (0 <= cx < 4 and 0 <= cy < 4):
+                        break
+                    mask |= square_bit(cx, cy)
+                else:
+                    placements.append((mask, ((x, y), orient), secondary_orient))
+    return placements
+
+def buildByteSquares(offset):
+    """
+    For every byte value, lists the (x, y) squares of the set bits, starting at bit offset.
+    """
+    return [tuple((((i + offset) % 4, (i + offset) // 4)) for i in range(8) if byte >> i & 1) for byte in range(256)]
 
+# Move generation tables, generated once at import
+l_placements = buildLPlacements()
+l_masks = {key: mask for mask, key, _ in l_placements}
+mask_to_l = {mask: key for mask, key, _ in l_placements}
+square_coords = [(i % 4, i // 4) for i in range(16)]
+low_byte_squares = buildByteSquares(0)
+high_byte_squares = buildByteSquares(8)
 
-    return legal_actions
+def mask_squares(mask):
+    """
+    Returns the (x, y) squares set in a 16-bit mask. Used for neutral piece destinations.
+    """
+    return low_byte_squares[mask & 0xFF] + high_byte_squares[mask >> 8 & 0xFF]
 
-def isValidLMove(position, orientation, board):
+def has_legal_l_move(p1_mask, p2_mask, neutral_mask, turn):
     """
-    Checks if placing the L-piece at a given position and orientation is valid.
-    Ensures the placement go out of bounds.
+    Checks whether the player to move has any legal move, stopping at the first free L placement.
+    Neutral moves are optional, so a free placement is all it takes.
     """
+    own_mask, other_mask = (p1_mask, p2_mask) if turn == 1 else (p2_mask, p1_mask)
+    blocked = other_mask | neutral_mask
+    for mask, _, _ in l_placements:
+        if not mask & blocked and mask != own_mask:
+            return True
+    return False
+
+def generateActions(own_mask, other_mask, neutral_mask):
+    """
+    Generates the set of legal actions for the player whose L piece covers own_mask,
+    by looping over the precomputed L placements and testing each for conflicts.
+    """
+    blocked = other_mask | neutral_mask
+    neutral_squares = mask_squares(neutral_mask)
 
-    secondary_orient = getSecondaryOrientation(position, orientation)
+    legal_actions = set()
+    for mask, (position, orient), _ in l_placements:
+        # Can't overlap a piece or place the L back in the same spot
+        if mask & blocked or mask == own_mask:
+            continue
 
-    for rx, ry in orientations[orientation][secondary_orient]:
-        x, y = position[0] + rx, position[1] + ry
-        
-        if not (0 <= x < 4 and 0 <= y < 4):
-            return False
-            
-        if board[y][x] != '.':  # Occupied by another piece
-            return False
-    
-    return True
+        legal_actions.add((position, orient, None, None))
+        for newpos in mask_squares(0xFFFF & ~(blocked | mask)):
+            for oldpos in neutral_squares:
+                legal_actions.add((position, orient, oldpos, newpos))
+    return legal_actions
+
+free_placement_counts = {} # blocked mask -> number of L placements clear of it, filled as positions are seen
 
-def getNeutralMoves(board, oldpos):
+def count_free_placements(blocked):
     """
-    Generates all possible moves for a neutral piece.
-    Neutral pieces can move to any empty space or stay in their current position.
+    Counts the L placements that don't overlap the blocked squares.
+    Memoized, since there are only a few thousand distinct (other L piece + neutrals) masks.
     """
+    count = free_placement_counts.get(blocked)
+    if count is None:
+        count = sum(1 for mask, _, _ in l_placements if not mask & blocked)
+        free_placement_counts[blocked] = count
+    return count
 
-    moves = []
+def mobility_score(p1_mask, p2_mask, neutral_mask):
+    """
+    Returns evaluate_state()'s score, the difference in legal move counts, without generating any moves.
+    A player can move their L to every free placement except the one it is on, and each placement
+    has 13 actions: no neutral move, or either neutral moved to one of the 6 empty squares.
+    """
+    p1_moves = 13 * (count_free_placements(p2_mask | neutral_mask) - 1)
+    p2_moves = 13 * (count_free_placements(p1_mask | neutral_mask) - 1)
 
-    for x in range(4):
-        for y in range(4):
-            if board[y][x] == '.' or (x == oldpos[0] and y == oldpos[1]):
-                moves.append((oldpos, (x, y)))
-    return moves
+    # Check for terminal state
+    if p2_moves == 0:
+        return float('inf')  # Winning state
+    if p1_moves == 0:
+        return float('-inf')  # Losing state
+
+    # Heuristic: difference in legal moves
+    return p1_moves - p2_moves
 
-def playerTurn(state):
+def getLegalActions(state):
     """
-    Handles a player's turn. 
-    Displays the board, gets player input, validates the move, and updates the game state.
+    Returns all possible valid moves a player can make in the current game state.
+    Each move is represented as a tuple: ((player_pos), 'Orientation', (oldNeutralPos), (newNeutralPos)).
     """
 
     # Get current player's data
     player = state['turn']
     player_key = 'player1' if player == 1 else 'player2'
     other_player_key = 'player2' if player == 1 else 'player1'
-    player_pos = state[player_key]['position']
-    player_orient = state[player_key]['orientation']
-    neutral1_pos = state['neutral'][0]
-    neutral2_pos = state['neutral'][1]
-    player_secondary_orient = getSecondaryOrientation(player_pos, player_orient)
-    legal_actions = getLegalActions(state)
 
-    board = buildBoard(state)
-    printBoard(board)
+    own_mask = l_masks[(state[player_key]['position'], state[player_key]['orientation'])]
+    other_mask = l_masks[(state[other_player_key]['position'], state[other_player_key]['orientation'])]
+    neutral_mask = 0
+    for x, y in state['neutral']:
+        neutral_mask |= square_bit(x, y)
 
-    if is_terminal(state):
-        terminalState(player)
-        return
+    return generateActions(own_mask, other_mask, neutral_mask)
+
+class Game:
+    """
+    A headless game of L: no printing, no input and no sys.exit().
+    The terminal UI drives one in a loop, as can anything else that plays games:
+        while game.result() is None:
+            game.play(game.best_move()[1])
+    """
+
+    def __init__(self, state=None):
+        self.state = copy.deepcopy(initial_state if state is None else state)
+        self.history = [] # Moves played so far
+
+    @property
+    def turn(self):
+        return self.state['turn']
+
+    def legal_moves(self):
+        return getLegalActions(self.state)
+
+    def play(self, move):
+        """
+        Plays a move for the player to move. Raises ValueError if it is not legal.
+        """
+        if move not in self.legal_moves():
+            raise ValueError("Not a legal move")
+        make_move(self.state, move)
+        self.history.append(move)
+
+    def best_move(self, depth=None, movetime=None, stats=None):
+        """
+        Searches for the best move for the player to move, to a fixed depth or for movetime milliseconds,
+        or within the command line limits if neither is given. Returns (score, move).
+        When every move loses, minimax() has no best move, so the one evaluate_state() likes best is played.
+        Raises ValueError if depth is less than 1.
+        """
+        if depth is not None and depth < 1:
+            raise ValueError(f"Depth must be an integer greater than 0, not {depth}")
+        score, move = findBestAction(self.state, self.turn == 1, stats, depth, movetime)
+        if move is None and self.result() is None:
+            sign = 1 if self.turn == 1 else -1
+            move = max(sorted(self.legal_moves(), key=format_move), key=lambda action: sign * evaluate_state(apply_action(self.state, action)))
+        return score, move
+
+    def result(self):
+        """
+        Returns None while the game is in progress, otherwise the winning player.
+        """
+        if not is_terminal(self.state):
+            return None
+        return self.turn % 2 + 1
+
+def playGame(game, computer_players):
+    """
+    Runs the terminal UI for a game until it ends. computer_players are the players (1, 2) the computer moves for.
+    """
+
+    while True:
+        computer = game.turn in computer_players
+        if computer:
+            if game.turn == 1:
+                global_vars['moves'] += 1
+                print("\n--------------------")
+                print("Turn", global_vars['moves'])
+
+            if global_vars['game_mode'] == 'PvC':
+                print("Computer's turn...")
+            else:
+                print(f"\nComputer {game.turn}'s turn...")
+
+        printBoard(buildBoard(game.state))
+
+        if game.result() is not None:
+            terminalState(game.turn)
+            return
+
+        if computer:
+            computerTurn(game)
+        else:
+            playerTurn(game)
+
+def playerTurn(game):
+    """
+    Handles a player's turn. 
+    Gets player input and validates the move until a legal one is played.
+    """
+
+    player = game.turn
+    board = buildBoard(game.state)
 
     # Wait for player input
     while True:
         try: 
-            playerInput = getPlayerInput(player, state, board)
+            playerInput = getPlayerInput(player, game.state, board)
 
             # Check if its a valid move
-            if playerInput in legal_actions:
-                
-                # Update player position
-                player_pos, player_orient, old_neutral_pos, neutral_pos = playerInput
-                state[player_key]['position'] = player_pos
-                state[player_key]['orientation'] = player_orient
-
-                # Update neutral positions
-                if neutral_pos != None:
-                    if state['neutral'][0] == old_neutral_pos:
-                        state['neutral'][0] = neutral_pos
-                    else:
-                        state['neutral'][1] = neutral_pos
-
-                # Update player turn
-                state['turn'] = state['turn']%2 + 1
-
-                break
-                
-            else:
+            if playerInput not in game.legal_moves():
                 if (global_vars['debug']): print(f"{playerInput} not in legalMoves")
-                raise ValueError("Not a legal move")
+            game.play(playerInput)
+            return
 
         except ValueError as e: 
             print(f"\nInvalid input: {e}. Please try again.\n")
             continue
 
-     # Proceed to next turn
-    if global_vars['game_mode'] == 'PvP':
-        playerTurn(state)
-    elif global_vars['game_mode'] == 'PvC':
-        computerTurn(state)
-    else:
-        raise Exception("Something went wrong with the gamemode selection")
-    return
-
-def computerTurn(state):
+def computerTurn(game):
     """
     Executes the computer's turn. 
-    Uses the minimax algorithm to determine the best move and updates the game state.
+    Uses the minimax algorithm to determine the best move and plays it.
     """
 
     # Track the execution time of turn
     start_time = time.time()
 
-    # Get current player's data
-    player = state['turn']
-    
-    player_key = 'player1' if player == 1 else 'player2'
-    other_player_key = 'player2' if player == 1 else 'player1'
-    player_pos = state[player_key]['position']
-    player_orient = state[player_key]['orientation']
-    neutral1_pos = state['neutral'][0]
-    neutral2_pos = state['neutral'][1]
-    player_secondary_orient = getSecondaryOrientation(player_pos, player_orient)
-    legal_actions = getLegalActions(state)
-
-    board = buildBoard(state)
-
-        
-    if (player == 1):
-        global_vars['moves'] += 1
-        print("\n--------------------")
-        print("Turn", global_vars['moves'])
-
-    if global_vars['game_mode'] == 'PvC':
-        print("Computer's turn...")
-    else:
-        print(f"\nComputer {player}'s turn...")
-    
-    printBoard(board)
-
-    if is_terminal(state):
-        terminalState(player)
-        return
-
-    if (player == 1):
-        bool_player = True
-    else:
-        bool_player = False
-    
-    _, best_action = minimax(state, board, global_vars['depth'], float('-inf'), float('inf'), bool_player)
-
-    global_vars['visited'] = set() # reset visited set
-    
-    if (global_vars['debug']):
-        #print("legal actions:", legal_actions)
-        print("best_action:", best_action, "score:", _)
+    player = game.turn
 
     # Player 2 is random
     if player == 2 and global_vars['random_cpu'] == True:
-        best_action = random.choice(list(legal_actions))
+        best_action = random.choice(list(game.legal_moves()))
     else:
-        if best_action is None and legal_actions: # When minimax fails to find an action, choose the best action based of evaluate_state()
-            action_priority_queue = []
-            for action in legal_actions:
-                new_state = apply_action(state, action)
-                heuristic_score = evaluate_state(new_state)
-                priority = -heuristic_score
-                heapq.heappush(action_priority_queue, (priority, len(action_priority_queue), action))  
-            best_action = heapq.heappop(action_priority_queue)[2]
-        
-        elif best_action is None:
-            terminalState(player)
-            return
-    
+        stats = SearchStats() if global_vars['stats_json'] is not None else None
+        search_start_time = time.time()
+        if global_vars['profile'] is not None:
+            _, best_action = profileSearch(game, stats)
+        else:
+            _, best_action = game.best_move(stats=stats)
+        if stats is not None:
+            writeSearchStats(global_vars['stats_json'], game.state, _, best_action, stats, time.time() - search_start_time)
+
+        if (global_vars['debug']):
+            print("best_action:", best_action, "score:", _)
+
     # Update state with the best action
-    state = apply_action(state, best_action)
+    game.play(best_action)
 
     # Print the computer's move in the required format
     
@@ -354,6 +427,10 @@ def computerTurn(state):
         print("Nodes evalutated:", global_vars['nodes_evaluated'])
         global_vars['nodes_evaluated'] = 0
 
+        report = tt_report()
+        print(f"Transposition table: {report['used']}/{report['size']} entries, {round(report['bytes'] / 1024)} KB, "
+              f"hit rate {round(report['hit_rate'] * 100, 1)}%, {report['evictions']} evictions")
+
         end_time = time.time()
         execution_time = end_time - start_time
         print(f"Execution Time: {round(execution_time, 2)} seconds")
@@ -374,18 +451,93 @@ def computerTurn(state):
         else:
             print("No execution times recorded. Unable to compute averages or total runtime.")
 
-    
-    # Proceed to next turn
     if global_vars['stepbystep'] and global_vars['game_mode'] == 'CvC':
         input()
 
-    if global_vars['game_mode'] == 'PvC':
-        playerTurn(state)
-    elif global_vars['game_mode'] == 'CvC':
-        computerTurn(state)
+def findBestAction(state, maximizing_player, stats=None, depth=None, movetime=None):
+    """
+    Picks the computer's move: from the tablebase or opening book if one is loaded and has the position,
+    otherwise by a minimax search limited by --movetime or to the fixed minimax depth. Returns (score, action).
+    Passing a depth or movetime overrides those limits for this search.
+    If a SearchStats is passed in, the search fills in its counters.
+    """
+
+    if global_vars['tablebase'] is not None:
+        return tablebase_best_action(state)
+
+    if global_vars['book'] is not None:
+        move = book_move(state)
+        if move is not None:
+            return move
+
+    cache_load()
+    global_vars['tt_age'] = (global_vars['tt_age'] + 1) % 16 # Entries from earlier moves can be replaced
+
+    if depth is None and movetime is None:
+        depth, movetime = global_vars['depth'], global_vars['movetime']
+
+    reset_move_ordering()
+
+    global_vars['stats'] = stats
+    try:
+        if movetime is not None:
+            search_state = state_to_bitboard(state) if global_vars['engine'] == 'bitboard' else copy.deepcopy(state)
+            return iterative_deepening(search_state, movetime, maximizing_player)
+
+        search_state = state_to_bitboard(state) if global_vars['engine'] == 'bitboard' else state
+        if global_vars['threads'] > 1:
+            return parallel_minimax(search_state, depth, maximizing_player)
+        return minimax(search_state, None, depth, float('-inf'), float('inf'), maximizing_player)
+    finally:
+        global_vars['stats'] = None
+
+def profileSearch(game, stats=None):
+    """
+    Runs game.best_move() under cProfile, writing the profile to the --profile directory
+    and adding it to the whole game's profile.
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(game.best_move, stats=stats)
+
+    directory = global_vars['profile']
+    os.makedirs(directory, exist_ok=True)
+    # Numbered by ply, since global_vars['moves'] only counts player 1's turns
+    path = os.path.join(directory, f"move{len(game.history) + 1:03d}_player{game.turn}.pstats")
+    profiler.dump_stats(path)
+
+    if global_vars['profile_stats'] is None:
+        global_vars['profile_stats'] = pstats.Stats(path)
     else:
-        raise Exception("Something went wrong with the gamemode selection")
-    return
+        global_vars['profile_stats'].add(path)
+    return result
+
+def printProfileSummary(count=15):
+    """
+    Prints the functions that took the most time over every profiled search of the game,
+    and saves the combined profile next to the per move ones.
+    """
+    profile_stats = global_vars['profile_stats']
+    if profile_stats is None:
+        return
+    profile_stats.dump_stats(os.path.join(global_vars['profile'], "game.pstats"))
+    print(f"Hottest functions over all computer searches (profiles in {global_vars['profile']}):")
+    profile_stats.sort_stats('tottime').print_stats(count)
+
+def writeSearchStats(path, state, score, action, stats, seconds):
+    """
+    Appends one search's counters to a JSON lines file.
+    """
+    record = {
+        'move': global_vars['moves'],
+        'player': state['turn'],
+        'action': format_move(action) if action is not None else None,
+        'score': str(score) if score in (float('inf'), float('-inf')) else score, # JSON has no infinity
+        'seconds': seconds,
+    }
+    record.update(stats.to_dict())
+    record['tt'] = tt_report()
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
 
 def evaluate_state(state):
     """
@@ -393,11 +545,6 @@ def evaluate_state(state):
     Positive values favor the current player, while negative values favor the opponent.
     """
 
-    player = state['turn'] % 2 + 1
-    opponent = 1 if player == 2 else 2
-
-    temp = state['turn']
-
     """ player = 1 # maximizing player
     opponent = 2 # minimizing player"""
 
@@ -423,23 +570,9 @@ def evaluate_state(state):
     if normal_board in standardized_loss_states:
         return float('-inf')"""
     
-    # Get legal moves for both players
-    state['turn'] = 1
-    player_moves = len(getLegalActions(state))
-
-    state['turn'] = 2
-    opponent_moves = len(getLegalActions(state))
-
-    state['turn'] = temp  # Reset turn
-
-    # Check for terminal state
-    if opponent_moves == 0:
-        return float('inf')  # Winning state
-    if player_moves == 0:
-        return float('-inf')  # Losing state
-
-    # Heuristic: difference in legal moves
-    return player_moves - opponent_moves
+    # Count legal moves for both players without generating them
+    p1_mask, p2_mask, neutral_mask, _ = state_to_bitboard(state)
+    return mobility_score(p1_mask, p2_mask, neutral_mask)
 
 def printBoard(board):
     for row in board:
@@ -531,104 +664,840 @@ def board_to_lex_string(board):
     """
     return ''.join(''.join(row) for row in board)
 
-def minimax(state, board, depth, alpha, beta, maximizing_player):
+# Transposition table entry flags: the stored score is exact, a lower bound (beta cut-off) or an upper bound (alpha cut-off)
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+
+
+# Fast symmetries for the hot path. Each of the 8 symmetries of the board (the dihedral group D4,
+# in the same order as build_symmetries()) is precomputed as a permutation of the 16 squares,
+# and as byte lookup tables that permute a whole 16-bit mask in two lookups
+square_symmetries = [
+    [y * 4 + x for x, y in [transform(*square_coords[i]) for i in range(16)]]
+    for transform in [
+        lambda x, y: (x, y),            # Identity
+        lambda x, y: (3 - y, x),        # 90° clockwise rotation
+        lambda x, y: (3 - x, 3 - y),    # 180° clockwise rotation
+        lambda x, y: (y, 3 - x),        # 270° clockwise rotation
+        lambda x, y: (x, 3 - y),        # Horizontal reflection
+        lambda x, y: (3 - x, y),        # Vertical reflection
+        lambda x, y: (y, x),            # Diagonal reflection
+        lambda x, y: (3 - y, 3 - x),    # Anti-diagonal reflection
+    ]
+]
+inverse_symmetry = [square_symmetries.index([perm.index(i) for i in range(16)]) for perm in square_symmetries]
+
+def buildSymmetryMaskTables(perm):
+    """
+    Builds the (low byte, high byte) lookup tables that apply a square permutation to a 16-bit mask.
+    """
+    tables = []
+    for offset in (0, 8):
+        table = []
+        for byte in range(256):
+            mask = 0
+            for i in range(8):
+                if byte >> i & 1:
+                    mask |= 1 << perm[i + offset]
+            table.append(mask)
+        tables.append(table)
+    return tables
+
+symmetry_mask_tables = [buildSymmetryMaskTables(perm) for perm in square_symmetries]
+
+def transform_mask(mask, sym):
+    """
+    Applies symmetry number sym to a 16-bit mask.
+    """
+    low, high = symmetry_mask_tables[sym]
+    return low[mask & 0xFF] | high[mask >> 8]
+
+def canonical_bitboard(bb):
+    """
+    Returns (canonical position, sym): the smallest of the 8 symmetric images of a bitboard
+    as a tuple, and the symmetry that maps the bitboard onto it.
+    All symmetric positions share the same canonical position.
+    """
+    p1_mask, p2_mask, neutral_mask, turn = bb
+    best, best_sym = None, 0
+    for sym, (low, high) in enumerate(symmetry_mask_tables):
+        image = (low[p1_mask & 0xFF] | high[p1_mask >> 8], low[p2_mask & 0xFF] | high[p2_mask >> 8],
+                 low[neutral_mask & 0xFF] | high[neutral_mask >> 8], turn)
+        if best is None or image < best:
+            best, best_sym = image, sym
+    return best, best_sym
+
+def transform_action(action, sym):
+    """
+    Applies symmetry number sym to an action. Use inverse_symmetry[sym] to map it back.
+    """
+    if action is None:
+        return None
+
+    position, orient, old_neutral_pos, new_neutral_pos = action
+    position, orient = mask_to_l[transform_mask(l_masks[(position, orient)], sym)]
+    if new_neutral_pos is None:
+        return (position, orient, None, None)
+
+    perm = square_symmetries[sym]
+    old_x, old_y = old_neutral_pos
+    new_x, new_y = new_neutral_pos
+    return (position, orient, square_coords[perm[old_y * 4 + old_x]], square_coords[perm[new_y * 4 + new_x]])
+
+
+# Zobrist hashing. Every (piece, square) pair gets a random 64-bit key and a position hashes to
+# the XOR of the keys of its occupied squares, plus a side-to-move key when it's player 2's turn.
+# A hash is kept for each of the 8 symmetric frames, so the smallest of them identifies the
+# position up to symmetry. Seeded so hashes are the same in every run and process.
+zobrist_random = random.Random(175)
+zobrist_piece_keys = [[zobrist_random.getrandbits(64) for _ in range(16)] for _ in range(3)] # player1, player2, neutral
+zobrist_turn = zobrist_random.getrandbits(64)
+
+def buildZobristKeys(piece, mask):
+    """
+    Returns the Zobrist key of a piece covering mask in each of the 8 symmetric frames.
+    """
+    keys = []
+    for perm in square_symmetries:
+        key = 0
+        for i in range(16):
+            if mask >> i & 1:
+                key ^= zobrist_piece_keys[piece][perm[i]]
+        keys.append(key)
+    return keys
+
+zobrist_l = [{mask: buildZobristKeys(player, mask) for mask, _, _ in l_placements} for player in (0, 1)]
+zobrist_neutral = [buildZobristKeys(2, 1 << i) for i in range(16)]
+
+def zobrist_hashes(bb):
+    """
+    Computes the 8 symmetric Zobrist hashes of a bitboard from scratch.
+    The search only does this at the root, zobrist_update() derives the rest.
+    """
+    p1_mask, p2_mask, neutral_mask, turn = bb
+    hashes = [a ^ b for a, b in zip(zobrist_l[0][p1_mask], zobrist_l[1][p2_mask])]
+    for i in range(16):
+        if neutral_mask >> i & 1:
+            hashes = [h ^ k for h, k in zip(hashes, zobrist_neutral[i])]
+    if turn == 2:
+        hashes = [h ^ zobrist_turn for h in hashes]
+    return hashes
+
+def zobrist_update(hashes, turn, old_mask, action):
+    """
+    Returns the hashes after the player to move takes their L piece off old_mask and plays action.
+    XORs out the old L squares and neutral square and XORs in the new ones.
+    """
+    (x, y), orient, old_neutral_pos, new_neutral_pos = action
+    keys = zobrist_l[turn - 1]
+    old_keys, new_keys = keys[old_mask], keys[l_masks[((x, y), orient)]]
+
+    if new_neutral_pos is None:
+        return [h ^ a ^ b ^ zobrist_turn for h, a, b in zip(hashes, old_keys, new_keys)]
+
+    (a, b), (c, d) = old_neutral_pos, new_neutral_pos
+    return [h ^ k1 ^ k2 ^ k3 ^ k4 ^ zobrist_turn for h, k1, k2, k3, k4
+            in zip(hashes, old_keys, new_keys, zobrist_neutral[b * 4 + a], zobrist_neutral[d * 4 + c])]
+
+def tt_slots():
+    """
+    Returns the number of transposition table slots for global_vars['tt_size'], a whole number of two-slot buckets.
+    Raises ValueError if it is too small for one bucket.
+    """
+    if global_vars['tt_size'] < 2:
+        raise ValueError(f"The transposition table needs at least 2 entries, not {global_vars['tt_size']}")
+    return global_vars['tt_size'] // 2 * 2
+
+def tt_clear():
+    """
+    Empties the transposition table, sizing it to global_vars['tt_size'] entries, and resets its counters.
+    A shared table keeps its size and is zeroed in place, for every process using it.
+    """
+    global_vars['tt_stats'] = dict.fromkeys(('probes', 'hits', 'stores', 'evictions'), 0)
+    if global_vars['tt_shared'] is not None:
+        shm = global_vars['tt_shared']
+        shm.buf[:] = bytes(shm.size)
+        return
+    global_vars['tt'] = [None] * tt_slots()
+
+def tt_probe(key):
+    """
+    Returns the transposition table entry (key, depth, flag, score, best_action, turn, age) for a position, or None.
+    """
+    table = global_vars['tt']
+    tt_stats = global_vars['tt_stats']
+    tt_stats['probes'] += 1
+    if global_vars['tt_shared'] is not None:
+        i = key % (len(table) // 4) * 4
+        for j in (i, i + 2):
+            data = table[j + 1]
+            if data and table[j] ^ data == key: # Fails for a slot another process is halfway through writing
+                tt_stats['hits'] += 1
+                return (key,) + tt_unpack(data)
+    else:
+        i = key % (len(table) // 2) * 2
+        for entry in (table[i], table[i + 1]):
+            if entry is not None and entry[0] == key:
+                tt_stats['hits'] += 1
+                return entry
+    return None
+
+def tt_store(key, depth, flag, score, best_action, turn):
+    """
+    Stores a search result in the transposition table.
+    Each bucket has a depth-preferred slot, only replaced by an equal or deeper search of any position
+    or once its entry is from an earlier move, and an always-replace slot that takes everything else.
+    Entries are aged by global_vars['tt_age'], which findBestAction() moves on for every search.
+    A shared table written by selfplay() or buildBook() workers isn't aged, as each worker is on its own move.
+    """
+    age = global_vars['tt_age']
+    if global_vars['cache_db'] is not None and depth >= global_vars['cache_min_depth']:
+        cache_store(key, depth, flag, score, best_action, turn, age)
+
+    table = global_vars['tt']
+    tt_stats = global_vars['tt_stats']
+    tt_stats['stores'] += 1
+    if global_vars['tt_shared'] is not None:
+        i = key % (len(table) // 4) * 4
+        data = tt_pack(depth, flag, score, best_action, turn, age)
+        deep_data = table[i + 1]
+        stale = global_vars['tt_aging'] and deep_data >> 60 != age
+        j = i if not deep_data or table[i] ^ deep_data == key or stale or depth >= deep_data & 0xFF else i + 2
+        if table[j + 1] and table[j] ^ table[j + 1] != key:
+            tt_stats['evictions'] += 1
+        table[j], table[j + 1] = key ^ data, data
+        return
+
+    i = key % (len(table) // 2) * 2
+    entry = (key, depth, flag, score, best_action, turn, age)
+
+    deep_entry = table[i]
+    j = i if deep_entry is None or deep_entry[0] == key or deep_entry[6] != age or depth >= deep_entry[1] else i + 1
+    if table[j] is not None and table[j][0] != key:
+        tt_stats['evictions'] += 1
+    table[j] = entry
+
+def tt_report():
+    """
+    Returns the transposition table's size in entries, entries in use, approximate memory in bytes,
+    and its probes, hits, hit rate, stores and evictions since it was last cleared.
+    """
+    table = global_vars['tt']
+    if global_vars['tt_shared'] is not None:
+        size = len(table) // 2
+        used = sum(1 for data in table[1::2] if data)
+        memory = global_vars['tt_shared'].size
+    else:
+        size = len(table)
+        used = sum(1 for entry in table if entry is not None)
+        memory = sys.getsizeof(table) + sum(sys.getsizeof(entry) for entry in table if entry is not None)
+    tt_stats = global_vars['tt_stats']
+    hit_rate = tt_stats['hits'] / tt_stats['probes'] if tt_stats['probes'] else 0
+    return dict(size=size, used=used, bytes=memory, hit_rate=hit_rate, **tt_stats)
+
+def encode_action(action):
+    """
+    Packs an action into 16 bits, 0 for None: its L placement, and the neutral move's squares if any.
+    """
+    if action is None:
+        return 0
+    position, orient, old_neutral_pos, new_neutral_pos = action
+    neutral_move = 0
+    if old_neutral_pos is not None:
+        (old_x, old_y), (new_x, new_y) = old_neutral_pos, new_neutral_pos
+        neutral_move = 1 + (old_y * 4 + old_x) * 16 + new_y * 4 + new_x
+    return 1 + placement_index[l_masks[(position, orient)]] * 257 + neutral_move
+
+def decode_action(code):
+    if code == 0:
+        return None
+    placement, neutral_move = divmod(code - 1, 257)
+    position, orient = l_placements[placement][1]
+    if neutral_move == 0:
+        return (position, orient, None, None)
+    old_square, new_square = divmod(neutral_move - 1, 16)
+    return (position, orient, square_coords[old_square], square_coords[new_square])
+
+def tt_pack(depth, flag, score, best_action, turn, age=0):
+    """
+    Packs a transposition table entry into one 64-bit word for the shared table:
+    depth (8 bits), flag (2), turn (2), best action (16), score (32, with the ends for -inf and inf) and age (4).
+    The depth is never 0, so neither is the word.
+    """
+    if score == float('-inf'):
+        score_code = 0
+    elif score == float('inf'):
+        score_code = 2 ** 32 - 1
+    else:
+        score_code = score + 2 ** 31
+    return depth | flag << 8 | turn << 10 | encode_action(best_action) << 12 | score_code << 28 | age << 60
+
+def tt_unpack(data):
+    """
+    Returns (depth, flag, score, best_action, turn, age) from a word packed by tt_pack().
+    """
+    score_code = data >> 28 & 0xFFFFFFFF
+    if score_code == 0:
+        score = float('-inf')
+    elif score_code == 2 ** 32 - 1:
+        score = float('inf')
+    else:
+        score = score_code - 2 ** 31
+    return data & 0xFF, data >> 8 & 0x3, score, decode_action(data >> 12 & 0xFFFF), data >> 10 & 0x3, data >> 60
+
+def tt_share():
+    """
+    Moves the transposition table into shared memory, for worker processes to attach to with tt_attach().
+    Each entry is two 64-bit words: the entry packed by tt_pack(), and that XORed with the position's key.
+    Processes read and write them without locking, a half-written entry just fails the key check.
+    """
+    if global_vars['tt_shared'] is not None:
+        return
+    slots = tt_slots()
+    shm = shared_memory.SharedMemory(create=True, size=slots * 16)
+    tt_attach(shm.name, shm)
+    tt_clear()
+    atexit.register(tt_unshare, unlink=True)
+
+def tt_attach(name, shm=None):
+    """
+    Uses the shared transposition table created by tt_share() in another process.
+    """
+    if global_vars['tt_shared'] is not None:
+        if global_vars['tt_shared'].name == name:
+            return # Already attached, e.g. inherited from the parent through fork
+        tt_unshare()
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+    global_vars['tt_shared'] = shm
+    global_vars['tt'] = shm.buf.cast('Q')
+
+def tt_unshare(unlink=False):
+    """
+    Detaches from the shared transposition table, going back to a private one.
+    The process that created it also unlinks it.
+    """
+    shm = global_vars['tt_shared']
+    if shm is None:
+        return
+    global_vars['tt'].release()
+    global_vars['tt_shared'] = None
+    shm.close()
+    if unlink:
+        shm.unlink()
+    tt_clear()
+
+CACHE_VERSION = 1 # Bump whenever the evaluation or the entry format changes, so old cache files are refused
+
+def cache_load():
+    """
+    Opens the --cache-file the first time a search needs it, creating the file if it is new.
+    Raises ValueError if the file was written by a different CACHE_VERSION.
+    Entries are looked up one at a time by cache_probe() rather than read into memory,
+    so the file can grow without the engine's memory growing with it.
+    """
+    if global_vars['cache_file'] is None or global_vars['cache_db'] is not None:
+        return
+    connection = sqlite3.connect(global_vars['cache_file'])
+    with connection:
+        if connection.execute("SELECT count(*) FROM sqlite_master").fetchone()[0] == 0:
+            connection.execute("CREATE TABLE positions (key INTEGER PRIMARY KEY, entry INTEGER NOT NULL)")
+            connection.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version != CACHE_VERSION:
+        connection.close()
+        raise ValueError(f"{global_vars['cache_file']} is a version {version} cache file, this engine uses version {CACHE_VERSION}")
+    global_vars['cache_db'] = connection
+    global_vars['cache_pending'] = {}
+    atexit.register(cache_close)
+
+def cache_key(key):
+    """
+    Returns a Zobrist key as the signed integer SQLite stores.
+    """
+    return key - 2 ** 64 if key >= 2 ** 63 else key
+
+def cache_probe(key):
+    """
+    Returns the --cache-file entry (key, depth, flag, score, best_action, turn, age) for a position, or None.
+    """
+    if global_vars['cache_db'] is None:
+        return None
+    entry = global_vars['cache_pending'].get(key)
+    if entry is not None:
+        return entry
+    row = global_vars['cache_db'].execute("SELECT entry FROM positions WHERE key = ?", (cache_key(key),)).fetchone()
+    if row is None:
+        return None
+    return (key,) + tt_unpack(row[0])
+
+def cache_store(key, depth, flag, score, best_action, turn, age):
+    """
+    Keeps a search result for the --cache-file unless a deeper one is waiting to be written.
+    Results are written out by cache_flush() every global_vars['cache_batch'] of them.
+    """
+    pending = global_vars['cache_pending']
+    cached = pending.get(key)
+    if cached is None or depth >= cached[1]:
+        pending[key] = (key, depth, flag, score, best_action, turn, age)
+        if len(pending) >= global_vars['cache_batch']:
+            cache_flush()
+
+def cache_flush():
+    """
+    Writes the results stored since the last flush to the --cache-file in one transaction.
+    Returns how many were written.
+    """
+    if global_vars['cache_db'] is None or not global_vars['cache_pending']:
+        return 0
+    rows = []
+    for key, entry in global_vars['cache_pending'].items():
+        rows.append((cache_key(key), tt_pack(*entry[1:6]))) # Without the age, which only matters within a run
+
+    with global_vars['cache_db']:
+        # The depth is the entry's low byte, keep whichever search was deeper
+        global_vars['cache_db'].executemany("INSERT INTO positions (key, entry) VALUES (?, ?) "
+                                            "ON CONFLICT (key) DO UPDATE SET entry = excluded.entry WHERE (excluded.entry & 255) >= (entry & 255)", rows)
+    global_vars['cache_pending'] = {}
+    return len(rows)
+
+def cache_close():
+    """
+    Writes any remaining results and closes the --cache-file.
+    """
+    if global_vars['cache_db'] is None:
+        return
+    cache_flush()
+    global_vars['cache_db'].close()
+    global_vars['cache_db'] = None
+
+tt_clear()
+
+class SearchTimeout(Exception):
+    """
+    Raised inside minimax() once the iterative deepening time budget has run out.
+    """
+
+class SearchStats:
+    """
+    Per ply search counters, filled in by minimax() while it is global_vars['stats'].
+    Ply 0 is the root. A depth 1 node's children are scored in one batch and counted at the next ply.
+    cutoff_index counts how many cut-offs came from the first, second... move tried at that ply.
+    """
+    COUNTERS = ('nodes', 'leaf_evals', 'beta_cutoffs', 'alpha_cutoffs', 'tt_probes', 'tt_hits', 'tt_cutoffs')
+
+    def __init__(self):
+        self.plies = []
+
+    def ply(self, ply):
+        while len(self.plies) <= ply:
+            counters = dict.fromkeys(self.COUNTERS, 0)
+            counters['cutoff_index'] = collections.Counter()
+            self.plies.append(counters)
+        return self.plies[ply]
+
+    def total(self, counter):
+        return sum(counters[counter] for counters in self.plies)
+
+    def branching_factors(self):
+        """
+        Nodes at each ply divided by nodes at the ply before it.
+        """
+        return [counters['nodes'] / parent['nodes'] if parent['nodes'] else 0
+                for parent, counters in zip(self.plies, self.plies[1:])]
+
+    def effective_branching_factor(self):
+        """
+        The branching factor a uniform tree would need to reach as many nodes at the deepest ply.
+        """
+        if len(self.plies) < 2 or not self.plies[0]['nodes']:
+            return 0
+        return (self.plies[-1]['nodes'] / self.plies[0]['nodes']) ** (1 / (len(self.plies) - 1))
+
+    def to_dict(self):
+        plies = []
+        for ply, (counters, branching_factor) in enumerate(zip(self.plies, self.branching_factors() + [None])):
+            plies.append({'ply': ply, **counters, 'cutoff_index': dict(sorted(counters['cutoff_index'].items())), 'branching_factor': branching_factor})
+        totals = {counter: self.total(counter) for counter in self.COUNTERS}
+        return {'totals': totals, 'effective_branching_factor': self.effective_branching_factor(), 'plies': plies}
+
+def iterative_deepening(state, movetime, maximizing_player):
+    """
+    Runs minimax() at depth 1, 2, 3... until movetime milliseconds have passed.
+    Returns (score, action) from the deepest search that finished.
+    Each iteration tries the previous one's best move first, through the transposition table.
+    An unfinished search can leave the state half-modified, so pass in a copy.
+    """
+
+    start_time = time.time()
+    depth = 1
+
+    # Always finish depth 1 so there is a move to play
+    score, best_action = minimax(state, None, depth, float('-inf'), float('inf'), maximizing_player)
+    global_vars['deadline'] = start_time + movetime / 1000
+    try:
+        while abs(score) != float('inf'): # Stop early once the game is decided
+            depth += 1
+            score, best_action = minimax(state, None, depth, float('-inf'), float('inf'), maximizing_player)
+    except SearchTimeout:
+        depth -= 1
+    finally:
+        global_vars['deadline'] = None
+
+    if global_vars['debug']:
+        print(f"Searched to depth {depth} in {round(time.time() - start_time, 2)} seconds")
+    return score, best_action
+
+WORKER_SETTINGS = ('depth', 'movetime', 'engine', 'priorityq', 'tt_size')
+
+def initWorker(settings, state, tt_name, shared_bound=None):
+    """
+    Copies the command line settings and initial state into a worker process of any pool, --threads,
+    selfplay() or buildBook(), and attaches it to the shared transposition table.
+    --threads workers also get the shared root bound.
+    """
+    global initial_state
+    global_vars.update(settings)
+    global_vars['threads'] = 1 # The workers already run in parallel
+    global_vars['shared_bound'] = shared_bound
+    global_vars['tt_aging'] = shared_bound is not None # Only --threads workers search the same move, with the main process's age
+    global_vars['cache_file'] = global_vars['cache_db'] = None # Only the main process uses the --cache-file
+    initial_state = state
+    tt_attach(tt_name)
+
+def getSearchPool():
+    """
+    Returns the --threads worker pool, starting it on first use. The workers share one transposition table.
+    """
+    if global_vars['search_pool'] is None:
+        tt_share()
+        settings = {key: global_vars[key] for key in WORKER_SETTINGS}
+        global_vars['shared_bound'] = multiprocessing.Value('d', 0.0)
+        global_vars['search_pool'] = concurrent.futures.ProcessPoolExecutor(
+            global_vars['threads'], initializer=initWorker, initargs=(settings, initial_state, global_vars['tt_shared'].name, global_vars['shared_bound']))
+    return global_vars['search_pool']
+
+def searchRootMoves(state, actions, depth, maximizing_player, search_id, tt_age):
+    """
+    Searches some root moves in a worker process, starting from the best root score found so far by any worker.
+    Returns [(score, bound the move was searched from), ...] and the nodes evaluated.
+    """
+    if global_vars['search_id'] != search_id:
+        global_vars['search_id'] = search_id
+        global_vars['tt_age'] = tt_age
+        reset_move_ordering()
+    global_vars['nodes_evaluated'] = 0
+
+    engine = get_engine(state)
+    shared_bound = global_vars['shared_bound']
+    results = []
+    for action in actions:
+        bound = shared_bound.value
+        alpha, beta = (bound, float('inf')) if maximizing_player else (float('-inf'), bound)
+
+        undo = engine['make_move'](state, action)
+        eval, _ = minimax(state, None, depth - 1, alpha, beta, not maximizing_player)
+        engine['unmake_move'](state, undo)
+        results.append((eval, bound))
+
+        # Only a score better than the bound is exact, and only then can it improve the bound
+        with shared_bound.get_lock():
+            if (eval > shared_bound.value) if maximizing_player else (eval < shared_bound.value):
+                shared_bound.value = eval
+    return results, global_vars['nodes_evaluated']
+
+def parallel_minimax(state, depth, maximizing_player):
+    """
+    Root-split minimax() over --threads worker processes, sharing the best root score so far
+    as the alpha (or beta) bound through a multiprocessing value.
+    Root moves with the same L placement reach many of the same positions, so each placement is one task
+    and its moves share a worker's transposition table. The first placement is searched before the rest
+    are split, so they start with a good bound. Returns (score, action) like minimax().
+    """
+    engine = get_engine(state)
+    if depth <= 1 or engine['is_terminal'](state):
+        return minimax(state, None, depth, float('-inf'), float('inf'), maximizing_player)
+
+    pool = getSearchPool()
+    global_vars['shared_bound'].value = float('-inf') if maximizing_player else float('inf')
+    global_vars['search_id'] += 1
+
+    groups = {}
+    for action in iter_legal_actions(state):
+        groups.setdefault(action[:2], []).append(action)
+    groups = list(groups.values())
+
+    first = pool.submit(searchRootMoves, state, groups[0], depth, maximizing_player, global_vars['search_id'], global_vars['tt_age'])
+    first.result()
+    futures = [first] + [pool.submit(searchRootMoves, state, actions, depth, maximizing_player, global_vars['search_id'], global_vars['tt_age']) for actions in groups[1:]]
+
+    # Merge in move order, so ties go to the same move as a single process search
+    best_eval = float('-inf') if maximizing_player else float('inf')
+    best_action = None
+    for actions, future in zip(groups, futures):
+        results, nodes = future.result()
+        global_vars['nodes_evaluated'] += nodes + len(actions)
+        for action, (eval, bound) in zip(actions, results):
+            if (eval > best_eval and eval > bound) if maximizing_player else (eval < best_eval and eval < bound):
+                best_eval, best_action = eval, action
+    return best_eval, best_action
+
+def tt_flag(score, alpha, beta):
+    """
+    Classifies a score searched with the window (alpha, beta) as exact or a bound.
+    """
+    if score <= alpha:
+        return TT_UPPER
+    if score >= beta:
+        return TT_LOWER
+    return TT_EXACT
+
+def minimax(state, board, depth, alpha, beta, maximizing_player, hashes=None, ply=0):
     """
     Implements the Minimax algorithm with alpha-beta pruning.
     Evaluates the best move for the current player given the game state.
+    The board argument is no longer needed, results are cached by Zobrist hash.
+    hashes are the state's symmetric Zobrist hashes, computed at the root and updated incrementally below it.
+    ply is the distance from the root, for the counters in global_vars['stats'].
     """
 
-    if depth == 0:
-        return evaluate_state(state), None
+    engine = get_engine(state)
 
-    board_tuple = tuple(map(tuple, board))
-    if board_tuple in global_vars['visited']:
-        return global_vars['cache'][board_tuple]  # Return cached value if available      
+    if global_vars['deadline'] is not None and time.time() > global_vars['deadline']:
+        raise SearchTimeout()
 
-    legal_actions = getLegalActions(state)
-    if not legal_actions:
-        return evaluate_state(state), None
+    stats = global_vars['stats']
+    if stats is not None:
+        ply_stats = stats.ply(ply)
+        ply_stats['nodes'] += 1
+
+    if depth == 0:
+        if stats is not None: ply_stats['leaf_evals'] += 1
+        return engine['evaluate_state'](state), None
+
+    # All 8 symmetric positions share one entry keyed by the smallest hash,
+    # stored moves are mapped through the symmetry that produced it
+    if hashes is None:
+        hashes = engine['hashes'](state)
+    key = min(hashes)
+    sym = hashes.index(key)
+
+    # Reuse a stored result if it was searched at least this deep
+    entry = tt_probe(key)
+    if entry is None and depth >= global_vars['cache_min_depth']:
+        entry = cache_probe(key) # Results from earlier runs, not worth a lookup for shallow searches
+    if stats is not None:
+        ply_stats['tt_probes'] += 1
+        ply_stats['tt_hits'] += entry is not None
+    tt_action = None
+    if entry is not None:
+        tt_action = transform_action(entry[4], inverse_symmetry[sym])
+    if entry is not None and entry[1] >= depth:
+        flag, score = entry[2], entry[3]
+        if flag == TT_EXACT:
+            if stats is not None: ply_stats['tt_cutoffs'] += 1
+            return score, tt_action
+        if flag == TT_LOWER:
+            alpha = max(alpha, score)
+        else:
+            beta = min(beta, score)
+        if beta <= alpha:
+            if stats is not None: ply_stats['tt_cutoffs'] += 1
+            return score, tt_action
+
+    if engine['is_terminal'](state):
+        if stats is not None: ply_stats['leaf_evals'] += 1
+        return engine['evaluate_state'](state), None
+
+    # The children are leaves, score them all in one pass
+    if depth == 1:
+        legal_actions = engine['getLegalActions'](state)
+        global_vars['nodes_evaluated'] += len(legal_actions)
+        if stats is not None:
+            child_stats = stats.ply(ply + 1)
+            child_stats['nodes'] += len(legal_actions)
+            child_stats['leaf_evals'] += len(legal_actions)
+        best_eval, best_action = None, None
+        for action, eval in zip(legal_actions, evaluate_children(engine['bitboard'](state), legal_actions)):
+            if best_eval is None or (eval > best_eval if maximizing_player else eval < best_eval):
+                best_eval, best_action = eval, action
+        tt_store(key, depth, tt_flag(best_eval, alpha, beta), best_eval, transform_action(best_action, sym), engine['turn'](state))
+        return best_eval, best_action
+
+    # Generate moves lazily, best first, so a cut-off skips generating the rest
+    first_actions = [tt_action]
+    if global_vars['priorityq']:
+        first_actions += global_vars['killers'].get(depth, [])
+    legal_actions = iter_legal_actions(state, first_actions)
 
     best_action = None
+    alpha_window, beta_window = alpha, beta
+    turn = engine['turn'](state)
+    old_mask = engine['l_mask'](state)
 
     if maximizing_player:
         max_eval = float('-inf')
-        if (global_vars['priorityq']): legal_actions = prioritize_actions(state, legal_actions, True) # alpha-beta huerestic
-        for action in legal_actions:
+        for index, action in enumerate(legal_actions):
+            child_hashes = zobrist_update(hashes, turn, old_mask, action)
             global_vars['nodes_evaluated'] += 1
-            new_state = apply_action(state, action)
-            new_board = buildBoard(new_state)
-            eval, _ = minimax(new_state, new_board, depth - 1, alpha, beta, False)
+            undo = engine['make_move'](state, action)
+            eval, _ = minimax(state, None, depth - 1, alpha, beta, False, child_hashes, ply + 1)
+            engine['unmake_move'](state, undo)
             if eval > max_eval:
                 max_eval = eval
                 best_action = action
             alpha = max(alpha, eval)
             if beta <= alpha:
+                if global_vars['priorityq']: record_cutoff(action, depth)
+                if stats is not None:
+                    ply_stats['beta_cutoffs'] += 1
+                    ply_stats['cutoff_index'][index] += 1
                 break  # Beta cut-off
         # Cache the result
-        global_vars['visited'].add(board_tuple)
-        global_vars['cache'][board_tuple] = (max_eval, best_action)
+        tt_store(key, depth, tt_flag(max_eval, alpha_window, beta_window), max_eval, transform_action(best_action, sym), turn)
         return max_eval, best_action
     else:
         min_eval = float('inf')
-        if (global_vars['priorityq']): legal_actions = prioritize_actions(state, legal_actions, False) # alpha-beta huerestic
-        for action in legal_actions:
+        for index, action in enumerate(legal_actions):
+            child_hashes = zobrist_update(hashes, turn, old_mask, action)
             global_vars['nodes_evaluated'] += 1
-            new_state = apply_action(state, action)
-            new_board = buildBoard(new_state)
-            eval, _ = minimax(new_state, new_board, depth - 1, alpha, beta, True)
+            undo = engine['make_move'](state, action)
+            eval, _ = minimax(state, None, depth - 1, alpha, beta, True, child_hashes, ply + 1)
+            engine['unmake_move'](state, undo)
             if eval < min_eval:
                 min_eval = eval
                 best_action = action
             beta = min(beta, eval)
             if beta <= alpha:
+                if global_vars['priorityq']: record_cutoff(action, depth)
+                if stats is not None:
+                    ply_stats['alpha_cutoffs'] += 1
+                    ply_stats['cutoff_index'][index] += 1
                 break  # Alpha cut-off
         # Cache the result
-        global_vars['visited'].add(board_tuple)
-        global_vars['cache'][board_tuple] = (min_eval, best_action)
+        tt_store(key, depth, tt_flag(min_eval, alpha_window, beta_window), min_eval, transform_action(best_action, sym), turn)
         return min_eval, best_action
 
-def prioritize_actions(state, legal_actions, maximizing_player):
+def is_legal_action(own_mask, other_mask, neutral_mask, action):
     """
-    Assign priorities to legal actions based on a heuristic evaluation of the resulting state.
-    CURRENTLY UNUSED
+    Checks a single action against a position without generating the others.
     """
-    action_priority_queue = []
-    for action in legal_actions:
-
-        new_state = apply_action(state, action)
-        heuristic_score = evaluate_state(new_state)
-        # Use negative scores for maximizing player (to simulate max-heap behavior with min-heap)
-        priority = -heuristic_score if maximizing_player else heuristic_score
-        heapq.heappush(action_priority_queue, (priority, len(action_priority_queue), action))  
-    return [heapq.heappop(action_priority_queue)[2] for _ in range(len(action_priority_queue))]
-
-def apply_action(state, action):
+    position, orient, old_neutral_pos, new_neutral_pos = action
+    mask = l_masks.get((position, orient))
+    blocked = other_mask | neutral_mask
+    if mask is None or mask & blocked or mask == own_mask:
+        return False
+    if new_neutral_pos is None:
+        return True
+    return bool(neutral_mask & square_bit(*old_neutral_pos)) and not (blocked | mask) & square_bit(*new_neutral_pos)
+
+def iter_legal_actions(state, first_actions=()):
+    """
+    Lazily yields the same actions as getLegalActions(), in stages, so a search that cuts off early
+    never generates the rest. Any legal first_actions (the transposition table move, killers) come first.
+    Then the L placements, best first: by history score, then by how few placements they leave the opponent.
+    Each placement's neutral moves are only generated when the search gets to it, ordered by history score.
+    """
+    p1_mask, p2_mask, neutral_mask, turn = get_engine(state)['bitboard'](state)
+    own_mask, other_mask = (p1_mask, p2_mask) if turn == 1 else (p2_mask, p1_mask)
+
+    yielded = []
+    for action in first_actions:
+        if action is not None and action not in yielded and is_legal_action(own_mask, other_mask, neutral_mask, action):
+            yielded.append(action)
+            yield action
+
+    blocked = other_mask | neutral_mask
+    placements = [(mask, key) for mask, key, _ in l_placements if not mask & blocked and mask != own_mask]
+    history = global_vars['history']
+    if global_vars['priorityq']:
+        l_history = global_vars['l_history']
+        placements.sort(key=lambda placement: (-l_history.get(placement[1], 0), count_free_placements(placement[0] | neutral_mask)))
+
+    neutral_squares = mask_squares(neutral_mask)
+    for mask, (position, orient) in placements:
+        actions = [(position, orient, None, None)]
+        for newpos in mask_squares(0xFFFF & ~(blocked | mask)):
+            for oldpos in neutral_squares:
+                actions.append((position, orient, oldpos, newpos))
+        if global_vars['priorityq'] and history:
+            actions.sort(key=lambda action: history.get(action, 0), reverse=True)
+
+        for action in actions:
+            if action not in yielded:
+                yield action
+
+def record_cutoff(action, depth):
+    """
+    Remembers a move that caused a cut-off as a killer for its depth and raises its history score.
+    Killers are kept per remaining depth, which within one search is per ply.
+    Actions are (L placement, neutral move), so the history table is keyed by the action itself,
+    and its L placement is scored too for ordering placements before their neutral moves exist.
+    """
+    killers = global_vars['killers'].setdefault(depth, [])
+    if action not in killers:
+        killers.insert(0, action)
+        del killers[2:]
+    global_vars['history'][action] = global_vars['history'].get(action, 0) + depth * depth
+    l_key = (action[0], action[1])
+    global_vars['l_history'][l_key] = global_vars['l_history'].get(l_key, 0) + depth * depth
+
+def reset_move_ordering():
+    global_vars['killers'] = {}
+    global_vars['history'] = {}
+    global_vars['l_history'] = {}
+
+def make_move(state, action):
     """
-    Applies a player's move to the game state, updating positions and orientations
-    of pieces and switching turns. Returns the new game state.
+    Applies a player's move to the game state in place, updating positions and orientations
+    of pieces and switching turns. Returns an undo record for unmake_move().
     """
 
-    new_state = copy.deepcopy(state)
-    player = new_state['turn']
+    player = state['turn']
     player_key = 'player1' if player == 1 else 'player2'
 
     # Unpack action
     (x, y), orient, old_neutral_pos, new_neutral_pos = action
 
+    # Undo record: (player_key, old position, old orientation, moved neutral index, old neutral position)
+    neutral_index = None
+    if new_neutral_pos is not None:
+        neutral_index = 0 if state['neutral'][0] == old_neutral_pos else 1
+    undo = (player_key, state[player_key]['position'], state[player_key]['orientation'], neutral_index,
+            state['neutral'][neutral_index] if neutral_index is not None else None)
+
     # Update player's L-piece
-    new_state[player_key]['position'] = (x, y)
-    new_state[player_key]['orientation'] = orient
+    state[player_key]['position'] = (x, y)
+    state[player_key]['orientation'] = orient
 
     # Update neutral pieces
-    if new_neutral_pos is not None:
-        if new_state['neutral'][0] == old_neutral_pos:
-            new_state['neutral'][0] = new_neutral_pos
-        else:
-            new_state['neutral'][1] = new_neutral_pos
+    if neutral_index is not None:
+        state['neutral'][neutral_index] = new_neutral_pos
 
     # Switch turn
-    new_state['turn'] = 1 if player == 2 else 2
+    state['turn'] = 1 if player == 2 else 2
+
+    return undo
 
+def unmake_move(state, undo):
+    """
+    Reverts a move made by make_move() using its undo record.
+    """
+
+    player_key, position, orient, neutral_index, neutral_pos = undo
+    state[player_key]['position'] = position
+    state[player_key]['orientation'] = orient
+    if neutral_index is not None:
+        state['neutral'][neutral_index] = neutral_pos
+    state['turn'] = 1 if player_key == 'player1' else 2
+
+def apply_action(state, action):
+    """
+    Applies a player's move to a copy of the game state. Returns the new game state.
+    The search uses make_move()/unmake_move() instead to avoid the copy.
+    """
+
+    new_state = copy.deepcopy(state)
+    make_move(new_state, action)
     return new_state
 
 def is_terminal(state):
@@ -636,8 +1505,85 @@ def is_terminal(state):
     Checks if the game is in a terminal state, i.e., no legal moves are available.
     """
 
-    legal_actions = getLegalActions(state)
-    return len(legal_actions) == 0
+    return not has_legal_l_move(*state_to_bitboard(state))
+
+def state_to_bitboard(state):
+    """
+    Converts a dict game state into a bitboard: [player1 mask, player2 mask, neutral mask, turn]
+    """
+    p1_mask = l_masks[(state['player1']['position'], state['player1']['orientation'])]
+    p2_mask = l_masks[(state['player2']['position'], state['player2']['orientation'])]
+    neutral_mask = 0
+    for x, y in state['neutral']:
+        neutral_mask |= square_bit(x, y)
+    return [p1_mask, p2_mask, neutral_mask, state['turn']]
+
+def bb_getLegalActions(bb):
+    """
+    Bitboard version of getLegalActions(). Returns the same set of action tuples.
+    """
+    p1_mask, p2_mask, neutral_mask, turn = bb
+    if turn == 1:
+        return generateActions(p1_mask, p2_mask, neutral_mask)
+    return generateActions(p2_mask, p1_mask, neutral_mask)
+
+def bb_make_move(bb, action):
+    """
+    Bitboard version of make_move(). The undo record is the old bitboard as a tuple.
+    """
+    undo = tuple(bb)
+    (x, y), orient, old_neutral_pos, new_neutral_pos = action
+
+    bb[bb[3] - 1] = l_masks[((x, y), orient)]
+    if new_neutral_pos is not None:
+        bb[2] ^= square_bit(*old_neutral_pos) | square_bit(*new_neutral_pos)
+    bb[3] = 1 if bb[3] == 2 else 2
+
+    return undo
+
+def bb_unmake_move(bb, undo):
+    """
+    Bitboard version of unmake_move().
+    """
+    bb[:] = undo
+
+def bb_apply_action(bb, action):
+    """
+    Bitboard version of apply_action(). Returns a new bitboard.
+    """
+    new_bb = list(bb)
+    bb_make_move(new_bb, action)
+    return new_bb
+
+def bb_is_terminal(bb):
+    """
+    Bitboard version of is_terminal().
+    """
+    return not has_legal_l_move(*bb)
+
+def bb_evaluate_state(bb):
+    """
+    Bitboard version of evaluate_state(). Scores are from player 1's perspective.
+    """
+    return mobility_score(bb[0], bb[1], bb[2])
+
+def evaluate_children(bb, legal_actions):
+    """
+    Scores the position after each action in one pass, as evaluate_state() would,
+    without making the moves. Returns a list of scores in the order of legal_actions.
+    """
+    p1_mask, p2_mask, neutral_mask, turn = bb
+    scores = []
+    for position, orient, old_neutral_pos, new_neutral_pos in legal_actions:
+        mask = l_masks[(position, orient)]
+        child_neutral_mask = neutral_mask
+        if new_neutral_pos is not None:
+            child_neutral_mask ^= square_bit(*old_neutral_pos) | square_bit(*new_neutral_pos)
+        if turn == 1:
+            scores.append(mobility_score(mask, p2_mask, child_neutral_mask))
+        else:
+            scores.append(mobility_score(p1_mask, mask, child_neutral_mask))
+    return scores
 
 def format_move(action):
     """
@@ -653,6 +1599,630 @@ def format_move(action):
         move_str += f" {a + 1} {b + 1} {c + 1} {d + 1}"
     return move_str
 
+engines = {
+    'dict': {
+        'getLegalActions': getLegalActions,
+        'apply_action': apply_action,
+        'make_move': make_move,
+        'unmake_move': unmake_move,
+        'evaluate_state': evaluate_state,
+        'is_terminal': is_terminal,
+        'hashes': lambda state: zobrist_hashes(state_to_bitboard(state)),
+        'bitboard': state_to_bitboard,
+        'turn': lambda state: state['turn'],
+        'l_mask': lambda state: l_masks[(state[f"player{state['turn']}"]['position'], state[f"player{state['turn']}"]['orientation'])],
+    },
+    'bitboard': {
+        'getLegalActions': bb_getLegalActions,
+        'apply_action': bb_apply_action,
+        'make_move': bb_make_move,
+        'unmake_move': bb_unmake_move,
+        'evaluate_state': bb_evaluate_state,
+        'is_terminal': bb_is_terminal,
+        'hashes': zobrist_hashes,
+        'bitboard': lambda bb: bb,
+        'turn': lambda bb: bb[3],
+        'l_mask': lambda bb: bb[bb[3] - 1],
+    },
+}
+
+def get_engine(state):
+    """
+    Returns the engine functions matching the state's representation (dict state or bitboard list).
+    """
+    return engines['bitboard'] if isinstance(state, list) else engines['dict']
+
+# Tablebase: every legal position solved by retrograde analysis.
+# Positions are indexed by (player1 placement, player2 placement, neutral pair, turn) and each
+# entry is one byte: 0 = not a legal position, 1 = draw,
+# 2 + 2 * d = side to move loses in d plies, 3 + 2 * d = side to move wins in d plies
+placement_index = {mask: i for i, (mask, _, _) in enumerate(l_placements)}
+neutral_pairs = [square_bit(*square_coords[a]) | square_bit(*square_coords[b]) for a in range(16) for b in range(a + 1, 16)]
+neutral_pair_index = {mask: i for i, mask in enumerate(neutral_pairs)}
+TABLEBASE_SIZE = len(l_placements) * len(l_placements) * len(neutral_pairs) * 2
+TABLEBASE_MAGIC = b'LGTB1'
+TB_DRAW = 1
+
+def tablebase_index(bb):
+    """
+    Perfect hash of a bitboard position into the tablebase.
+    """
+    p1_mask, p2_mask, neutral_mask, turn = bb
+    return ((placement_index[p1_mask] * len(l_placements) + placement_index[p2_mask]) * len(neutral_pairs)
+            + neutral_pair_index[neutral_mask]) * 2 + turn - 1
+
+def enumeratePositions():
+    """
+    Yields every legal position as a bitboard, for both sides to move.
+    """
+    for p1_mask, _, _ in l_placements:
+        for p2_mask, _, _ in l_placements:
+            if p1_mask & p2_mask:
+                continue
+            for neutral_mask in neutral_pairs:
+                if neutral_mask & (p1_mask | p2_mask):
+                    continue
+                yield [p1_mask, p2_mask, neutral_mask, 1]
+                yield [p1_mask, p2_mask, neutral_mask, 2]
+
+def solve():
+    """
+    Solves every legal position by retrograde analysis from the terminal positions.
+    Returns the tablebase as a bytearray indexed by tablebase_index() of the canonical position.
+    """
+
+    # Generate the unique successors of every canonical position, symmetric positions share a result
+    children = {}
+    for bb in enumeratePositions():
+        if tuple(bb) != canonical_bitboard(bb)[0]:
+            continue
+        child_indexes = {tablebase_index(canonical_bitboard(bb_apply_action(bb, action))[0]) for action in bb_getLegalActions(bb)}
+        children[tablebase_index(bb)] = array.array('I', child_indexes)
+
+    # Invert the move graph into a flat predecessor list
+    pred_start = array.array('I', [0]) * (TABLEBASE_SIZE + 1)
+    for child_indexes in children.values():
+        for child in child_indexes:
+            pred_start[child + 1] += 1
+    for index in range(TABLEBASE_SIZE):
+        pred_start[index + 1] += pred_start[index]
+    preds = array.array('I', [0]) * pred_start[TABLEBASE_SIZE]
+    fill = array.array('I', pred_start)
+    for index, child_indexes in children.items():
+        for child in child_indexes:
+            preds[fill[child]] = index
+            fill[child] += 1
+
+    # A player who can't move loses. Work backwards in order of distance.
+    table = bytearray(TABLEBASE_SIZE)
+    unresolved = array.array('I', [0]) * TABLEBASE_SIZE
+    queue = collections.deque()
+    for index, child_indexes in children.items():
+        unresolved[index] = len(child_indexes)
+        if not child_indexes:
+            table[index] = 2
+            queue.append(index)
+
+    while queue:
+        index = queue.popleft()
+        value = table[index]
+        distance = (value - 2) // 2 + 1
+        if distance > 126:
+            raise Exception("Distance to the end of the game doesn't fit in the tablebase")
+        for pred in preds[pred_start[index]:pred_start[index + 1]]:
+            if table[pred]:
+                continue
+            if value % 2 == 0:
+                # Moving into a lost position wins
+                table[pred] = 3 + 2 * distance
+                queue.append(pred)
+            else:
+                # Lost once every move leads to a won position
+                unresolved[pred] -= 1
+                if unresolved[pred] == 0:
+                    table[pred] = 2 + 2 * distance
+                    queue.append(pred)
+
+    # Anything left unresolved can be held forever
+    for index in children:
+        if not table[index]:
+            table[index] = TB_DRAW
+
+    return table
+
+def write_tablebase(path, table):
+    with open(path, 'wb') as f:
+        f.write(TABLEBASE_MAGIC)
+        f.write(table)
+
+def load_tablebase(path):
+    """
+    Memory-maps a tablebase written by write_tablebase() for the computer to play from.
+    Nothing is parsed or copied, so every process that loads the same file shares one
+    read-only copy in the OS page cache.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(TABLEBASE_MAGIC)] != TABLEBASE_MAGIC or len(mapped) != len(TABLEBASE_MAGIC) + TABLEBASE_SIZE:
+        mapped.close()
+        raise ValueError(f"{path} is not a valid tablebase file")
+    close_tablebase()
+    global_vars['tablebase'] = memoryview(mapped)[len(TABLEBASE_MAGIC):]
+
+def close_tablebase():
+    """
+    Unmaps the loaded tablebase, if any.
+    """
+    table = global_vars['tablebase']
+    global_vars['tablebase'] = None
+    if isinstance(table, memoryview):
+        mapped = table.obj
+        table.release()
+        mapped.close()
+
+def tablebase_lookup(bb):
+    """
+    Returns ('win' | 'loss' | 'draw', plies to the end of the game) for the side to move.
+    """
+    value = global_vars['tablebase'][tablebase_index(canonical_bitboard(bb)[0])]
+    if value == 0:
+        raise ValueError("Position is not in the tablebase")
+    if value == TB_DRAW:
+        return 'draw', None
+    return ('win' if value % 2 else 'loss'), (value - 2) // 2
+
+def tablebase_best_action(state):
+    """
+    Chooses a perfect-play move from the tablebase: the fastest win, otherwise a draw,
+    otherwise the slowest loss. Returns (result, action).
+    """
+    bb = state_to_bitboard(state)
+    best_rank, best_action = None, None
+    for action in bb_getLegalActions(bb):
+        undo = bb_make_move(bb, action)
+        result, distance = tablebase_lookup(bb)
+        bb_unmake_move(bb, undo)
+
+        # Rank from the mover's point of view, lower is better
+        if result == 'loss':
+            rank = (0, distance)
+        elif result == 'draw':
+            rank = (1, 0)
+        else:
+            rank = (2, -distance)
+        if best_rank is None or rank < best_rank:
+            best_rank, best_action = rank, action
+
+    if best_action is None:
+        return 'loss', None
+    return ('win', 'draw', 'loss')[best_rank[0]], best_action
+
+def solveTablebase(path):
+    start_time = time.time()
+    print("Solving every legal position...")
+    table = solve()
+    write_tablebase(path, table)
+
+    wins = sum(1 for value in table if value > TB_DRAW and value % 2)
+    losses = sum(1 for value in table if value > TB_DRAW and value % 2 == 0)
+    draws = table.count(TB_DRAW)
+    print(f"Solved {wins + losses + draws} unique positions in {round(time.time() - start_time, 2)} seconds "
+          f"({wins} wins, {losses} losses, {draws} draws for the side to move)")
+    print(f"Tablebase written to {path}")
+
+def perft(state, depth):
+    """
+    Counts the positions reachable in exactly depth plies (games that end sooner count 0),
+    using the move generator of the state's engine. A correctness check and benchmark for move generation.
+    """
+    if depth == 0:
+        return 1
+
+    engine = get_engine(state)
+    legal_actions = engine['getLegalActions'](state)
+    if depth == 1:
+        return len(legal_actions)
+
+    nodes = 0
+    for action in legal_actions:
+        undo = engine['make_move'](state, action)
+        nodes += perft(state, depth - 1)
+        engine['unmake_move'](state, undo)
+    return nodes
+
+def divide(state, depth):
+    """
+    Splits perft(state, depth) by root move. Returns {action: node count}.
+    """
+    engine = get_engine(state)
+    counts = {}
+    for action in engine['getLegalActions'](state):
+        undo = engine['make_move'](state, action)
+        counts[action] = perft(state, depth - 1)
+        engine['unmake_move'](state, undo)
+    return counts
+
+def runPerft(state, max_depth, show_divide):
+    if global_vars['engine'] == 'bitboard':
+        state = state_to_bitboard(state)
+
+    for depth in range(1, max_depth + 1):
+        start_time = time.time()
+        nodes = perft(state, depth)
+        execution_time = time.time() - start_time
+        nodes_per_second = round(nodes / execution_time) if execution_time > 0 else nodes
+        print(f"perft {depth}: {nodes} nodes in {round(execution_time, 3)} seconds ({nodes_per_second} nodes/s)")
+
+    if show_divide:
+        print(f"\ndivide {max_depth}:")
+        counts = divide(state, max_depth)
+        for action in sorted(counts, key=format_move):
+            print(f"{format_move(action)}: {counts[action]}")
+        print(f"Total: {sum(counts.values())}")
+
+def benchmarkPositions(count=50):
+    """
+    A fixed set of positions for benchmarking, from a seeded random game starting at the initial state.
+    """
+    rng = random.Random(175)
+    state = copy.deepcopy(initial_state)
+    positions = []
+    while len(positions) < count:
+        legal_actions = sorted(getLegalActions(state), key=format_move)
+        if not legal_actions:
+            state = copy.deepcopy(initial_state)
+            continue
+        state = apply_action(state, rng.choice(legal_actions))
+        positions.append(state)
+    return positions
+
+def timeCalls(function, items):
+    """
+    Times calling function on every item. Reports calls per second.
+    """
+    def run():
+        for item in items:
+            function(item)
+        return len(items)
+    return timeBenchmark(run)
+
+def referenceLoop():
+    """
+    A fixed piece of plain Python work that doesn't depend on the engine, timed next to every benchmark
+    to measure how fast the machine is running at the time. Returns how many operations it did.
+    """
+    total = 0
+    for i in range(10000):
+        total += i * i % 7
+    return 10000
+
+def timeSample(function, min_time):
+    """
+    Calls function() for at least min_time seconds. Returns operations per second, seconds per call and operations per call.
+    """
+    calls, count = 0, 0
+    start_time = time.perf_counter()
+    while True:
+        count += function()
+        calls += 1
+        execution_time = time.perf_counter() - start_time
+        if execution_time >= min_time:
+            return count / execution_time, execution_time / calls, count / calls
+
+def timeBenchmark(function, repeats=5, min_time=0.3):
+    """
+    Times function(), which returns how many operations it did. Each of a few samples calls it
+    for at least min_time seconds, so timer and scheduler noise stays small, and the median sample is kept.
+    Every sample is followed by referenceLoop(), and its speed relative to that is kept too, since on a
+    shared or throttled machine the speed of everything drifts from one run to the next.
+    Then runs it once more under tracemalloc for its peak memory.
+    """
+    samples = []
+    for _ in range(repeats):
+        per_second, seconds, count = timeSample(function, min_time)
+        reference, _, _ = timeSample(referenceLoop, min_time / 3)
+        samples.append((per_second / reference, per_second, seconds, count))
+    relative, per_second, seconds, count = sorted(samples)[len(samples) // 2]
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'seconds': seconds, 'per_second': per_second, 'relative': relative, 'count': count, 'peak_kb': peak / 1024}
+
+def benchmarkSearch(state, depth):
+    """
+    Times a fresh minimax() search. Reports nodes per second instead of searches per second.
+    """
+    def search():
+        tt_clear()
+        reset_move_ordering()
+        global_vars['nodes_evaluated'] = 0
+        minimax(copy.deepcopy(state), None, depth, float('-inf'), float('inf'), state['turn'] == 1)
+        nodes = global_vars['nodes_evaluated']
+        global_vars['nodes_evaluated'] = 0
+        return nodes
+
+    return timeBenchmark(search)
+
+def benchmark(names=None):
+    """
+    Runs the benchmark suite, or only the named benchmarks. Returns {benchmark name: {metric: value}}.
+    """
+    positions = benchmarkPositions()
+    bitboards = [state_to_bitboard(state) for state in positions]
+    boards = [buildBoard(state) for state in positions]
+    midgame = next(state for state in positions[len(positions) // 2:] if not is_terminal(state))
+
+    cases = {
+        'getLegalActions': lambda: timeCalls(getLegalActions, positions),
+        'bb_getLegalActions': lambda: timeCalls(bb_getLegalActions, bitboards),
+        'evaluate_state': lambda: timeCalls(evaluate_state, positions),
+        'build_symmetries': lambda: timeCalls(build_symmetries, boards),
+        'normalize_board': lambda: timeCalls(normalize_board, boards),
+        'canonical_bitboard': lambda: timeCalls(canonical_bitboard, bitboards),
+        'zobrist_hashes': lambda: timeCalls(zobrist_hashes, bitboards),
+        'perft 3': lambda: timeBenchmark(lambda: perft(state_to_bitboard(initial_state), 3)),
+    }
+    for depth in (3, 4, 5):
+        cases[f'minimax depth {depth} initial'] = lambda depth=depth: benchmarkSearch(initial_state, depth)
+        cases[f'minimax depth {depth} midgame'] = lambda depth=depth: benchmarkSearch(midgame, depth)
+    return {name: case() for name, case in cases.items() if names is None or name in names}
+
+def compareBenchmarks(results, baseline, threshold):
+    """
+    Returns a description of every benchmark whose speed or peak memory got worse than the baseline by more than threshold.
+    Speed is compared by the median sample's rate per second rather than by wall time, since search node counts vary a little from run to run,
+    and relative to referenceLoop() when both have that, so a machine that is busier or slower than when the baseline was taken isn't a regression.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        if baseline[name].get('relative') and metrics.get('relative') is not None:
+            old_speed, new_speed = baseline[name]['relative'], metrics['relative']
+            if new_speed < old_speed / (1 + threshold):
+                regressions.append(f"{name} speed relative to the reference loop: {old_speed:.3g} -> {new_speed:.3g}")
+        else:
+            old_speed, new_speed = baseline[name].get('per_second'), metrics.get('per_second')
+            if old_speed and new_speed is not None and new_speed < old_speed / (1 + threshold):
+                regressions.append(f"{name} per second: {round(old_speed)} -> {round(new_speed)}")
+        old_peak, new_peak = baseline[name].get('peak_kb'), metrics.get('peak_kb')
+        if old_peak and new_peak is not None and new_peak > old_peak * (1 + threshold):
+            regressions.append(f"{name} peak KB: {round(old_peak)} -> {round(new_peak)}")
+    return regressions
+
+def runBenchmark(path, update_baseline, threshold):
+    print("Running benchmarks...")
+    results = benchmark()
+
+    baseline = None
+    if os.path.exists(path) and not update_baseline:
+        with open(path) as f:
+            baseline = json.load(f)
+
+        # One slow run is usually a busy machine, so anything that looks worse is run again
+        # and judged by the median of its runs
+        slower = [name for name in results if compareBenchmarks({name: results[name]}, baseline, threshold)]
+        if slower:
+            print(f"Running {len(slower)} benchmarks that look worse than {path} again...")
+            runs = [results] + [benchmark(slower) for _ in range(global_vars['benchmark_runs'] - 1)]
+            for name in slower:
+                results[name] = {metric: sorted(run[name][metric] for run in runs)[len(runs) // 2] for metric in results[name]}
+
+    print(f"\n{'Benchmark':<28}{'Time (s)':>12}{'Per second':>14}{'Peak (KB)':>12}")
+    for name, metrics in results.items():
+        print(f"{name:<28}{metrics['seconds']:>12.4f}{round(metrics['per_second']):>14}{round(metrics['peak_kb']):>12}")
+    print()
+
+    if baseline is not None:
+        regressions = compareBenchmarks(results, baseline, threshold)
+        if regressions:
+            print(f"Regressions against {path}:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print(f"No regressions against {path}.")
+    else:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {path}")
+
+
+def playSelfplayGame(index, seed, depths, random_player2, max_moves):
+    """
+    Plays one computer vs computer game without any output, for selfplay().
+    A game still going after max_moves is a draw.
+    """
+    rng = random.Random(seed)
+    game = Game()
+    move_times, nodes = [], []
+
+    while game.result() is None and len(game.history) < max_moves:
+        start_time = time.perf_counter()
+        global_vars['nodes_evaluated'] = 0
+        if game.turn == 2 and random_player2:
+            move = rng.choice(sorted(game.legal_moves(), key=format_move))
+        else:
+            _, move = game.best_move(depth=depths[game.turn - 1])
+        move_times.append(time.perf_counter() - start_time)
+        nodes.append(global_vars['nodes_evaluated'])
+        game.play(move)
+
+    return {
+        'game': index,
+        'seed': seed,
+        'depths': list(depths),
+        'random_player2': random_player2,
+        'winner': game.result(),
+        'length': len(game.history),
+        'move_times': move_times,
+        'nodes': nodes,
+    }
+
+def selfplay(games, workers=None, depths=(None, None), random_fraction=0, seed=0, max_moves=200):
+    """
+    Plays a number of computer vs computer games across a pool of worker processes (one per core by default).
+    depths are the search depths of players 1 and 2, None for the --depth/--movetime limits,
+    and random_fraction of the games have a random player 2. The workers share one transposition table.
+    Yields each game's result as it finishes, with the winner (None for a draw), length,
+    and the time taken and nodes searched for every move.
+    """
+    rng = random.Random(seed)
+    tt_share()
+    settings = {key: global_vars[key] for key in WORKER_SETTINGS}
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=initWorker, initargs=(settings, initial_state, global_vars['tt_shared'].name)) as executor:
+            futures = [executor.submit(playSelfplayGame, index, rng.randrange(2 ** 32), depths, rng.random() < random_fraction, max_moves)
+                       for index in range(games)]
+            for future in concurrent.futures.as_completed(futures):
+                yield future.result()
+    finally:
+        tt_unshare(unlink=True)
+
+def runSelfplay(games, workers, depths, random_fraction, seed, max_moves):
+    start_time = time.time()
+    wins = {1: 0, 2: 0, None: 0}
+    total_moves, total_time, total_nodes = 0, 0, 0
+
+    for result in selfplay(games, workers, depths, random_fraction, seed, max_moves):
+        wins[result['winner']] += 1
+        total_moves += result['length']
+        total_time += sum(result['move_times'])
+        total_nodes += sum(result['nodes'])
+
+        outcome = f"player {result['winner']} wins" if result['winner'] is not None else "draw"
+        move_time = sum(result['move_times']) / result['length'] * 1000 if result['length'] else 0
+        opponent = ", random player 2" if result['random_player2'] else ""
+        print(f"Game {result['game'] + 1}: {outcome} in {result['length']} moves, "
+              f"{round(move_time, 1)} ms/move, {sum(result['nodes'])} nodes (seed {result['seed']}{opponent})")
+
+    elapsed = time.time() - start_time
+    print(f"\nPlayer 1 wins: {wins[1]}, player 2 wins: {wins[2]}, draws: {wins[None]}")
+    if total_moves:
+        print(f"Average game length: {round(total_moves / games, 1)} moves, average move time: {round(total_time / total_moves * 1000, 1)} ms")
+    if total_time:
+        print(f"Nodes per second (per worker): {round(total_nodes / total_time)}")
+    print(f"{games} games in {round(elapsed, 2)} seconds ({round(games / elapsed, 2)} games/second)")
+
+BOOK_MAGIC = b'LGBK1'
+
+def bookPositions(plies):
+    """
+    Returns {key: bitboard} for every position within plies moves of the initial state that is not already lost,
+    one per set of symmetric positions, keyed by Zobrist key.
+    """
+    positions = {}
+    frontier = {min(zobrist_hashes(state_to_bitboard(initial_state))): state_to_bitboard(initial_state)}
+    for _ in range(plies):
+        next_frontier = {}
+        for key, bb in frontier.items():
+            if key in positions or bb_is_terminal(bb):
+                continue
+            positions[key] = bb
+            for action in bb_getLegalActions(bb):
+                child = bb_apply_action(bb, action)
+                next_frontier.setdefault(min(zobrist_hashes(child)), child)
+        frontier = next_frontier
+    return positions
+
+def searchBookPosition(bb, depth):
+    """
+    Searches a book position in a worker process. Returns (key, score, best action in the key's frame).
+    """
+    reset_move_ordering()
+    hashes = zobrist_hashes(bb)
+    key = min(hashes)
+    score, action = minimax(list(bb), None, depth, float('-inf'), float('inf'), bb[3] == 1)
+    return key, score, transform_action(action, hashes.index(key)) if action is not None else None
+
+def buildBook(plies, depth, workers=None):
+    """
+    Searches every position within plies moves of the initial state to depth, across a pool of worker processes
+    sharing one transposition table. Returns {key: (key, depth, flag, score, best_action, turn, age)},
+    entries like the transposition table's, for positions where the side to move has a move that does not lose.
+    """
+    positions = bookPositions(plies)
+    tt_share()
+    settings = {key: global_vars[key] for key in WORKER_SETTINGS}
+
+    book = {}
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=initWorker, initargs=(settings, initial_state, global_vars['tt_shared'].name)) as executor:
+            futures = [executor.submit(searchBookPosition, bb, depth) for bb in positions.values()]
+            for future in concurrent.futures.as_completed(futures):
+                key, score, action = future.result()
+                if action is not None:
+                    book[key] = (key, depth, TT_EXACT, score, action, positions[key][3], 0)
+    finally:
+        tt_unshare(unlink=True)
+    return book
+
+def write_book(path, book):
+    """
+    Writes an opening book as pairs of 64-bit words: the position's key, and its entry packed by tt_pack().
+    """
+    words = array.array('Q')
+    for key in sorted(book):
+        words.extend((key, tt_pack(*book[key][1:])))
+    with open(path, 'wb') as f:
+        f.write(BOOK_MAGIC)
+        words.tofile(f)
+
+def load_book(path):
+    """
+    Loads an opening book written by write_book() for findBestAction() to play from.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(BOOK_MAGIC)] != BOOK_MAGIC or (len(data) - len(BOOK_MAGIC)) % 16:
+        raise ValueError(f"{path} is not a valid opening book file")
+    words = array.array('Q', data[len(BOOK_MAGIC):])
+    global_vars['book'] = {words[i]: (words[i],) + tt_unpack(words[i + 1]) for i in range(0, len(words), 2)}
+
+def book_move(state):
+    """
+    Returns (score, action) from the opening book for a state, or None if the book does not have it.
+    """
+    hashes = get_engine(state)['hashes'](state)
+    key = min(hashes)
+    entry = global_vars['book'].get(key)
+    if entry is None:
+        return None
+    return entry[3], transform_action(entry[4], inverse_symmetry[hashes.index(key)])
+
+def runBuildBook(path, plies, depth, workers):
+    start_time = time.time()
+    print(f"Searching the positions within {plies} moves of the initial state to depth {depth}...")
+    book = buildBook(plies, depth, workers)
+    write_book(path, book)
+    print(f"Wrote {len(book)} positions to {path} in {round(time.time() - start_time, 2)} seconds")
+
+def getFlagValue(flag, default):
+    """
+    Returns the value following a command line flag, e.g. --solve PATH, or the default if none was given.
+    """
+    i = sys.argv.index(flag)
+    if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith('--'):
+        return sys.argv[i + 1]
+    return default
+
+def getPositiveFlagValue(flag, default):
+    """
+    Returns the whole number following a command line flag, like getFlagValue().
+    Prints an error and exits if it is not a number greater than 0.
+    """
+    try:
+        value = int(getFlagValue(flag, default))
+        if value <= 0:
+            raise ValueError(f"{value} is not greater than 0")
+    except ValueError as e:
+        print(f"Error: {e}. The {flag} value must be a whole number greater than 0.")
+        sys.exit(1)
+    return value
+
 def getPlayerInput(playerID, state, board):
     """
     Prompts the player for a move input. Validates the format of the input
@@ -691,6 +2261,7 @@ def getPlayerInput(playerID, state, board):
                     print(f"\nUse this string to start from this game state: \n{x1} {y1} {orient1} {a} {b} {c} {d} {x2} {y2} {orient2}\n")
                 
                 if (user_input == 'quit()'):
+                    printProfileSummary()
                     sys.exit()
 
             parts = user_input.split()
@@ -742,9 +2313,14 @@ def terminalState(losingPlayer):
     winningPlayer = losingPlayer % 2 + 1
 
     print(f"Player {losingPlayer} has run out of moves. Player {winningPlayer} wins.\n")
+    written = cache_flush()
+    if global_vars['debug'] and global_vars['cache_file'] is not None:
+        print(f"Wrote {written} positions to {global_vars['cache_file']}")
+    printProfileSummary()
     sys.exit()
 
-def mainMenu():
+def parseArguments():
+    global initial_state
 
     # Parse cmd line arguments
     arguments = set(sys.argv)
@@ -754,6 +2330,85 @@ def mainMenu():
         global_vars['debug'] = True
     if "--stepbystep" in arguments:
         global_vars['stepbystep'] = True
+    if "--bitboard" in arguments:
+        global_vars['engine'] = 'bitboard'
+    if "--solve" in arguments:
+        solveTablebase(getFlagValue("--solve", 'L-Game.tb'))
+        sys.exit()
+    if "--tablebase" in arguments:
+        load_tablebase(getFlagValue("--tablebase", 'L-Game.tb'))
+    if "--movetime" in arguments:
+        global_vars['movetime'] = getPositiveFlagValue("--movetime", 1000)
+    if "--state" in arguments:
+        try:
+            state = parseStateString(getFlagValue("--state", ''))
+            buildBoard(state)
+        except Exception as e:
+            print(f"Error: {e}. The --state string is invalid.")
+            sys.exit(1)
+        initial_state = state
+    if "--profile" in arguments:
+        global_vars['profile'] = getFlagValue("--profile", 'profiles')
+    if "--stats-json" in arguments:
+        global_vars['stats_json'] = getFlagValue("--stats-json", 'search_stats.jsonl')
+    if "--tt-size" in arguments:
+        try:
+            global_vars['tt_size'] = int(getFlagValue("--tt-size", global_vars['tt_size']))
+            tt_clear()
+        except ValueError as e:
+            print(f"Error: {e}. The --tt-size must be a number of at least 2.")
+            sys.exit(1)
+    if "--cache-file" in arguments:
+        global_vars['cache_file'] = getFlagValue("--cache-file", 'L-Game.cache')
+        try:
+            cache_load()
+        except (ValueError, sqlite3.Error) as e:
+            print(f"Error: {e}. Delete it or choose another --cache-file.")
+            sys.exit(1)
+    if "--threads" in arguments:
+        global_vars['threads'] = getPositiveFlagValue("--threads", os.cpu_count())
+    if "--selfplay" in arguments:
+        depths = (None, None)
+        if "--depth" in arguments:
+            try:
+                depths = tuple(int(depth) for depth in getFlagValue("--depth", '3').split(','))
+                if len(depths) not in (1, 2) or min(depths) <= 0:
+                    raise ValueError(f"{getFlagValue('--depth', '3')} is not one or two depths greater than 0")
+            except ValueError as e:
+                print(f"Error: {e}. Use --depth D or --depth D1,D2 with whole numbers greater than 0.")
+                sys.exit(1)
+            if len(depths) == 1:
+                depths *= 2
+        random_fraction = float(getFlagValue("--randomCPU", 1)) if "--randomCPU" in arguments else 0
+        workers = getPositiveFlagValue("--workers", os.cpu_count()) if "--workers" in arguments else None
+        seed = int(getFlagValue("--seed", 0)) if "--seed" in arguments else 0
+        max_moves = getPositiveFlagValue("--max-moves", 200) if "--max-moves" in arguments else 200
+        runSelfplay(getPositiveFlagValue("--selfplay", 100), workers, depths, random_fraction, seed, max_moves)
+        sys.exit()
+    if "--build-book" in arguments:
+        depth = getPositiveFlagValue("--depth", 5) if "--depth" in arguments else 5
+        workers = getPositiveFlagValue("--workers", os.cpu_count()) if "--workers" in arguments else None
+        runBuildBook(getFlagValue("--book", 'L-Game.book') if "--book" in arguments else 'L-Game.book', getPositiveFlagValue("--build-book", 2), depth, workers)
+        sys.exit()
+    if "--book" in arguments:
+        load_book(getFlagValue("--book", 'L-Game.book'))
+    if "--benchmark" in arguments:
+        threshold = global_vars['benchmark_threshold']
+        if "--threshold" in arguments:
+            try:
+                threshold = float(getFlagValue("--threshold", threshold))
+                if threshold <= 0:
+                    raise ValueError(f"{threshold} is not greater than 0")
+            except ValueError as e:
+                print(f"Error: {e}. The --threshold must be a fraction greater than 0, e.g. 0.25 for 25%.")
+                sys.exit(1)
+        runBenchmark(getFlagValue("--benchmark", 'benchmark_baseline.json'), "--update-baseline" in arguments, threshold)
+        sys.exit()
+    if "--perft" in arguments:
+        runPerft(copy.deepcopy(initial_state), int(getFlagValue("--perft", 3)), "--divide" in arguments)
+        sys.exit()
+
+def mainMenu():
 
     while True:
         try:
@@ -772,7 +2427,7 @@ def mainMenu():
             if choice == '1':
                 print("Starting Player vs Player game...")
                 global_vars['game_mode'] = 'PvP'
-                playerTurn(initial_state)  # Start Player vs Player game
+                playGame(Game(initial_state), ())  # Start Player vs Player game
 
             elif choice == '2':
                 print("Starting Player vs Computer game...")
@@ -811,9 +2466,9 @@ def start_pvc():
             global_vars['game_mode'] = 'PvC'
 
             if starting_choice == '1':
-                playerTurn(copy.deepcopy(initial_state))
+                playGame(Game(initial_state), (2,))
             elif starting_choice == '2':
-                computerTurn(copy.deepcopy(initial_state))
+                playGame(Game(initial_state), (1,))
 
         except ValueError as e:
             print("\n--------------------")
@@ -822,7 +2477,67 @@ def start_pvc():
 
 def start_cvc():
     global_vars['game_mode'] = 'CvC'
-    computerTurn(copy.deepcopy(initial_state))
+    playGame(Game(initial_state), (1, 2))
+
+def parseStateString(user_input):
+    """
+    Parses a game state string in the format printed by save(), e.g. "3 1 W 1 1 4 4 2 4 E".
+    Returns a new state with player 1 to move. Raises ValueError if the string is malformed.
+    """
+    parts = user_input.split()
+    
+    # Validate length
+    if not (len(parts) == 10):
+        raise ValueError("Input must be 10 elements")
+
+    # Validate player1 coords (x, y)
+    try:
+        x1, y1 = (int(parts[0]) - 1, int(parts[1]) - 1)
+    except ValueError:
+        raise ValueError("Coordinates (x1, y1) must be integers between 1 and 4")
+    
+    if not (0 <= x1 < 4 and 0 <= y1 < 4):
+        raise ValueError("Coordinates (x1, y1) must be between 1 and 4")
+
+    # Validate p1 orientation
+    orient1 = parts[2].upper()
+    if orient1 not in {'N', 'E', 'S', 'W'}:
+        raise ValueError("Orientations must be one of 'N', 'S', 'E', 'W'")
+
+    #Validate neutral coords
+    try:
+        a, b, c, d = map(int, parts[3:7])
+        a, b, c, d = a - 1, b - 1, c - 1, d - 1  # Adjust for 0-based indexing
+    except ValueError:
+        raise ValueError("Neutral piece coordinates (a, b, c, d) must all be integers")
+
+    if not (0 <= a < 4 and 0 <= b < 4 and 0 <= c < 4 and 0 <= d < 4):
+        raise ValueError("Both coordinates (a, b) and (c, d) must be between 1 and 4")
+    
+    # Validate player2 coords (x, y)
+    try:
+        x2, y2 = (int(parts[7]) - 1, int(parts[8]) - 1)
+    except ValueError:
+        raise ValueError("Coordinates (x2, y2) must be integers between 1 and 4")
+    
+    if not (0 <= x2 < 4 and 0 <= y2 < 4):
+        raise ValueError("Coordinates (x1, y1) must be between 1 and 4")
+
+    # Validate p2 orientation
+    orient2 = parts[9].upper()
+    if orient2 not in {'N', 'E', 'S', 'W'}:
+        raise ValueError("Orientations must be one of 'N', 'S', 'E', 'W'")
+
+    copied_state = copy.deepcopy(initial_state)
+
+    # Update the initial state
+    copied_state['player1']['position'] = (x1, y1)
+    copied_state['player1']['orientation'] = (orient1)
+    copied_state['player2']['position'] = (x2, y2)
+    copied_state['player2']['orientation'] = (orient2)
+    copied_state['neutral'] = [(a, b), (c, d)]
+    copied_state['turn'] = 1
+    return copied_state
 
 def setInitialGameState():
     global initial_state
@@ -830,62 +2545,11 @@ def setInitialGameState():
     while(True):
         try:
             user_input = input("\nEnter new game state string: \n")
-            parts = user_input.split()
-            
-            # Validate length
-            if not (len(parts) == 10):
-                raise ValueError("Input must be 10 elements")
-
-            # Validate player1 coords (x, y)
-            try:
-                x1, y1 = (int(parts[0]) - 1, int(parts[1]) - 1)
-            except ValueError:
-                raise ValueError("Coordinates (x1, y1) must be integers between 1 and 4")
-            
-            if not (0 <= x1 < 4 and 0 <= y1 < 4):
-                raise ValueError("Coordinates (x1, y1) must be between 1 and 4")
-
-            # Validate p1 orientation
-            orient1 = parts[2].upper()
-            if orient1 not in {'N', 'E', 'S', 'W'}:
-                raise ValueError("Orientations must be one of 'N', 'S', 'E', 'W'")
-
-            #Validate neutral coords
-            try:
-                a, b, c, d = map(int, parts[3:7])
-                a, b, c, d = a - 1, b - 1, c - 1, d - 1  # Adjust for 0-based indexing
-            except ValueError:
-                raise ValueError("Neutral piece coordinates (a, b, c, d) must all be integers")
-
-            if not (0 <= a < 4 and 0 <= b < 4 and 0 <= c < 4 and 0 <= d < 4):
-                raise ValueError("Both coordinates (a, b) and (c, d) must be between 1 and 4")
-            
-            # Validate player2 coords (x, y)
-            try:
-                x2, y2 = (int(parts[7]) - 1, int(parts[8]) - 1)
-            except ValueError:
-                raise ValueError("Coordinates (x2, y2) must be integers between 1 and 4")
-            
-            if not (0 <= x2 < 4 and 0 <= y2 < 4):
-                raise ValueError("Coordinates (x1, y1) must be between 1 and 4")
-
-            # Validate p2 orientation
-            orient2 = parts[9].upper()
-            if orient2 not in {'N', 'E', 'S', 'W'}:
-                raise ValueError("Orientations must be one of 'N', 'S', 'E', 'W'")
+            copied_state = parseStateString(user_input)
 
         except ValueError as e:
             print(f"\nInvalid input: {e}. Please try again.\n")
             continue
-        
-        copied_state = copy.deepcopy(initial_state)
-
-        # Update the initial state
-        copied_state['player1']['position'] = (x1, y1)
-        copied_state['player1']['orientation'] = (orient1)
-        copied_state['player2']['position'] = (x2, y2)
-        copied_state['player2']['orientation'] = (orient2)
-        copied_state['neutral'] = [(a, b), (c, d)]
 
         try:
             buildBoard(copied_state)
@@ -1017,6 +2681,7 @@ def tinymax(state, depth):
 
 def main():
     
+    parseArguments()
     mainMenu()
 
 
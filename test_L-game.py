@@ -1,8 +1,71 @@
+import copy
+import sqlite3
+import sys
+import random
 import pytest
 from L_Game_copy import getSecondaryOrientation
 from L_Game_copy import evaluate_state
 from L_Game_copy import buildBoard
 from L_Game_copy import minimax
+from L_Game_copy import getLegalActions
+from L_Game_copy import state_to_bitboard
+from L_Game_copy import bb_getLegalActions
+from L_Game_copy import bb_evaluate_state
+from L_Game_copy import l_placements
+from L_Game_copy import apply_action
+from L_Game_copy import make_move
+from L_Game_copy import unmake_move
+from L_Game_copy import solve
+from L_Game_copy import global_vars
+from L_Game_copy import tablebase_lookup
+from L_Game_copy import tablebase_best_action
+from L_Game_copy import write_tablebase
+from L_Game_copy import load_tablebase
+from L_Game_copy import close_tablebase
+from L_Game_copy import tt_clear
+from L_Game_copy import canonical_bitboard
+from L_Game_copy import transform_mask
+from L_Game_copy import transform_action
+from L_Game_copy import inverse_symmetry
+from L_Game_copy import zobrist_hashes
+from L_Game_copy import zobrist_update
+from L_Game_copy import bb_apply_action
+from L_Game_copy import iterative_deepening
+from L_Game_copy import iter_legal_actions
+from L_Game_copy import record_cutoff
+from L_Game_copy import reset_move_ordering
+from L_Game_copy import evaluate_children
+from L_Game_copy import is_terminal
+from L_Game_copy import perft
+from L_Game_copy import divide
+from L_Game_copy import parseStateString
+from L_Game_copy import benchmarkPositions
+from L_Game_copy import compareBenchmarks
+from L_Game_copy import runBenchmark
+from L_Game_copy import SearchStats
+from L_Game_copy import findBestAction
+from L_Game_copy import profileSearch
+from L_Game_copy import Game
+from L_Game_copy import selfplay
+from L_Game_copy import parallel_minimax
+from L_Game_copy import tt_pack
+from L_Game_copy import tt_unpack
+from L_Game_copy import tt_share
+from L_Game_copy import tt_unshare
+from L_Game_copy import tt_store
+from L_Game_copy import tt_probe
+from L_Game_copy import TT_EXACT
+from L_Game_copy import TT_LOWER
+from L_Game_copy import cache_load
+from L_Game_copy import cache_flush
+from L_Game_copy import cache_probe
+from L_Game_copy import cache_close
+from L_Game_copy import tt_report
+from L_Game_copy import buildBook
+from L_Game_copy import write_book
+from L_Game_copy import load_book
+from L_Game_copy import book_move
+from L_Game_copy import getPositiveFlagValue
 
 @pytest.mark.parametrize(
     "state, expected",
@@ -49,6 +112,419 @@ def test_evaluate_state(state, expected):
     result = evaluate_state(state)
     assert result == expected
 
+def test_bitboard_engine():
+    # The bitboard engine must agree with the dict engine
+    for state in benchmarkPositions(50):
+        assert bb_evaluate_state(state_to_bitboard(state)) == evaluate_state(state)
+        assert bb_getLegalActions(state_to_bitboard(state)) == getLegalActions(state)
+
+def test_is_terminal():
+    positions = benchmarkPositions(50)
+    assert any(is_terminal(state) for state in positions)
+    for state in positions:
+        assert is_terminal(state) == (len(getLegalActions(state)) == 0)
+
+@pytest.mark.parametrize("maximizing_player, expected", [(False, float('-inf'))])
+def test_minimax_bitboard_depth3(state, maximizing_player, expected):
+    result, _ = minimax(state_to_bitboard(state), None, 3, float('-inf'), float('inf'), maximizing_player)
+    assert result == expected
+
+def test_l_placements():
+    assert len(l_placements) == 48
+    assert len({mask for mask, _, _ in l_placements}) == 48
+    for mask, (position, orient), secondary_orient in l_placements:
+        assert bin(mask).count('1') == 4
+        assert getSecondaryOrientation(position, orient) == secondary_orient
+
+def test_make_unmake_move(state):
+    original = copy.deepcopy(state)
+    for action in getLegalActions(state):
+        expected = apply_action(state, action)
+        undo = make_move(state, action)
+        assert state == expected
+        unmake_move(state, undo)
+        assert state == original
+
+def test_transposition_table_bounds(state):
+    tt_clear()
+    expected, _ = minimax(state_to_bitboard(state), None, 3, float('-inf'), float('inf'), False)
+
+    # A cut-off bound stored by a narrow window search must not be reused as an exact score
+    tt_clear()
+    minimax(state_to_bitboard(state), None, 3, 0, 1, False)
+    result, _ = minimax(state_to_bitboard(state), None, 3, float('-inf'), float('inf'), False)
+    assert result == expected
+
+def test_transposition_table_size(monkeypatch):
+    state = parseStateString("3 1 W 1 1 4 4 2 4 E")
+    monkeypatch.setitem(global_vars, 'tt_size', 64)
+    tt_clear()
+    _, action = minimax(state_to_bitboard(state), None, 3, float('-inf'), float('inf'), True)
+    assert action in getLegalActions(state)
+    report = tt_report()
+    assert report['size'] == 64
+    assert 0 < report['used'] <= 64
+    assert report['evictions'] > 0
+    assert report['hits'] <= report['probes']
+    assert 0 <= report['hit_rate'] <= 1
+    tt_clear()
+
+    # Too small for a single bucket
+    for size in (0, 1):
+        monkeypatch.setitem(global_vars, 'tt_size', size)
+        with pytest.raises(ValueError):
+            tt_clear()
+        with pytest.raises(ValueError):
+            tt_share()
+        assert global_vars['tt_shared'] is None
+    monkeypatch.setitem(global_vars, 'tt_size', 64)
+    tt_clear()
+
+def test_transposition_table_aging(monkeypatch):
+    tt_clear()
+    buckets = len(global_vars['tt']) // 2
+    monkeypatch.setitem(global_vars, 'tt_age', 0)
+    tt_store(7, 5, TT_EXACT, 1, None, 1)
+    tt_store(7 + buckets, 1, TT_EXACT, 2, None, 1)
+    tt_store(7 + 2 * buckets, 1, TT_EXACT, 3, None, 1)
+    assert tt_probe(7) is not None # The deep entry stays for the rest of its search
+    assert tt_probe(7 + buckets) is None
+
+    # But not into the next one
+    monkeypatch.setitem(global_vars, 'tt_age', 1)
+    tt_store(7 + 3 * buckets, 1, TT_EXACT, 4, None, 1)
+    assert tt_probe(7) is None
+    assert tt_probe(7 + 3 * buckets)[3] == 4
+    assert tt_report()['evictions'] == 2
+    tt_clear()
+
+@pytest.mark.parametrize("sym", range(8))
+def test_symmetries(state, sym):
+    bb = state_to_bitboard(state)
+    image = [transform_mask(bb[0], sym), transform_mask(bb[1], sym), transform_mask(bb[2], sym), bb[3]]
+    assert canonical_bitboard(image)[0] == canonical_bitboard(bb)[0]
+
+    # Legal actions map onto the symmetric position's legal actions and back
+    legal_actions = getLegalActions(state)
+    assert {transform_action(action, sym) for action in legal_actions} == bb_getLegalActions(image)
+    for action in legal_actions:
+        assert transform_action(transform_action(action, sym), inverse_symmetry[sym]) == action
+
+def test_zobrist_update(state):
+    bb = state_to_bitboard(state)
+    hashes = zobrist_hashes(bb)
+    for action in bb_getLegalActions(bb):
+        assert zobrist_update(hashes, bb[3], bb[1], action) == zobrist_hashes(bb_apply_action(bb, action))
+
+def test_iterative_deepening(state):
+    tt_clear()
+    result, action = iterative_deepening(copy.deepcopy(state), 100, False)
+    assert result == float('-inf')
+    assert action in getLegalActions(state)
+    assert global_vars['deadline'] is None
+
+def test_iter_legal_actions(state):
+    reset_move_ordering()
+    legal_actions = sorted(getLegalActions(state), key=str)
+    tt_action, killer, history_action = legal_actions[-1], legal_actions[-2], legal_actions[-3]
+    illegal_action = ((0, 0), 'E', None, None)
+    record_cutoff(killer, 3)
+    record_cutoff(history_action, 1)
+
+    # Every legal action exactly once, legal first actions in front
+    ordered = list(iter_legal_actions(state, [tt_action, illegal_action, killer, tt_action]))
+    assert len(ordered) == len(legal_actions)
+    assert sorted(ordered, key=str) == legal_actions
+    assert ordered[:2] == [tt_action, killer]
+
+    # Placements with a history score come next
+    ordered = list(iter_legal_actions(state_to_bitboard(state)))
+    assert ordered[0] == killer
+    assert sorted(ordered, key=str) == legal_actions
+    reset_move_ordering()
+
+def test_evaluate_children(state):
+    legal_actions = list(getLegalActions(state))
+    scores = evaluate_children(state_to_bitboard(state), legal_actions)
+    assert scores == [evaluate_state(apply_action(state, action)) for action in legal_actions]
+
+def test_children_are_unique(state):
+    # Every legal action leads to a different position, even up to symmetry
+    bb = state_to_bitboard(state)
+    hashes = zobrist_hashes(bb)
+    legal_actions = bb_getLegalActions(bb)
+    assert len({min(zobrist_update(hashes, bb[3], bb[1], action)) for action in legal_actions}) == len(legal_actions)
+
+@pytest.mark.parametrize("depth, expected", [(1, 65), (2, 7956), (3, 628797)])
+def test_perft(depth, expected):
+    initial = parseStateString("3 1 W 1 1 4 4 2 4 E")
+    assert perft(initial, depth) == expected
+    assert perft(state_to_bitboard(initial), depth) == expected
+    assert sum(divide(initial, depth).values()) == expected
+
+def test_benchmark_positions():
+    positions = benchmarkPositions(20)
+    assert len(positions) == 20
+    assert positions == benchmarkPositions(20)
+    assert all(buildBoard(state) for state in positions)
+
+def test_compare_benchmarks():
+    baseline = {'search': {'seconds': 1.0, 'per_second': 1000, 'peak_kb': 100}}
+    assert compareBenchmarks({'search': {'seconds': 1.1, 'per_second': 900, 'peak_kb': 110}}, baseline, 0.25) == []
+    assert len(compareBenchmarks({'search': {'seconds': 2.0, 'per_second': 500, 'peak_kb': 100}}, baseline, 0.25)) == 1
+    assert len(compareBenchmarks({'search': {'seconds': 2.0, 'per_second': 500, 'peak_kb': 200}}, baseline, 0.25)) == 2
+    assert compareBenchmarks({'new': {'seconds': 2.0, 'per_second': 1, 'peak_kb': 200}}, baseline, 0.25) == []
+
+    # A machine running at half speed isn't a regression when the reference loop slowed down as much
+    baseline = {'search': {'seconds': 1.0, 'per_second': 1000, 'relative': 2.0, 'peak_kb': 100}}
+    assert compareBenchmarks({'search': {'seconds': 2.0, 'per_second': 500, 'relative': 2.0, 'peak_kb': 100}}, baseline, 0.25) == []
+    assert len(compareBenchmarks({'search': {'seconds': 1.0, 'per_second': 1000, 'relative': 1.0, 'peak_kb': 100}}, baseline, 0.25)) == 1
+
+def test_run_benchmark(monkeypatch, tmp_path):
+    # Each run is a list of search speeds, used up one per call
+    def fake_benchmark(speeds):
+        def benchmark(names=None):
+            return {'search': {'seconds': 1.0, 'per_second': speeds.pop(0), 'peak_kb': 100}}
+        return benchmark
+    path = tmp_path / "baseline.json"
+    monkeypatch.setattr("L_Game_copy.benchmark", fake_benchmark([1000]))
+    runBenchmark(str(path), False, 0.25)
+    assert path.exists()
+
+    # One slow run is outvoted by the runs after it
+    monkeypatch.setattr("L_Game_copy.benchmark", fake_benchmark([500, 1000, 950]))
+    runBenchmark(str(path), False, 0.25)
+
+    # But not if most of them are slow, unless the threshold allows it
+    monkeypatch.setattr("L_Game_copy.benchmark", fake_benchmark([500, 600, 950]))
+    with pytest.raises(SystemExit):
+        runBenchmark(str(path), False, 0.25)
+    monkeypatch.setattr("L_Game_copy.benchmark", fake_benchmark([500, 600, 950]))
+    runBenchmark(str(path), False, 1.0)
+
+def test_search_stats(monkeypatch):
+    state = parseStateString("3 1 W 1 1 4 4 2 4 E")
+    monkeypatch.setitem(global_vars, 'movetime', None)
+    monkeypatch.setitem(global_vars, 'depth', 4)
+    monkeypatch.setitem(global_vars, 'nodes_evaluated', 0)
+    tt_clear()
+    stats = SearchStats()
+    _, action = findBestAction(state, True, stats)
+    assert action in getLegalActions(state)
+    assert global_vars['stats'] is None
+    assert len(stats.plies) == 5
+    assert stats.plies[0]['nodes'] == 1
+    assert stats.plies[1]['nodes'] == 65
+    assert stats.total('nodes') == global_vars['nodes_evaluated'] + 1
+    assert stats.plies[4]['nodes'] == stats.plies[4]['leaf_evals']
+    assert stats.total('tt_hits') <= stats.total('tt_probes')
+    for counters in stats.plies:
+        assert sum(counters['cutoff_index'].values()) == counters['beta_cutoffs'] + counters['alpha_cutoffs']
+    assert stats.to_dict()['plies'][1]['branching_factor'] == stats.plies[2]['nodes'] / 65
+
+def test_profile_search(monkeypatch, tmp_path):
+    state = parseStateString("3 1 W 1 1 4 4 2 4 E")
+    monkeypatch.setitem(global_vars, 'movetime', None)
+    monkeypatch.setitem(global_vars, 'depth', 2)
+    monkeypatch.setitem(global_vars, 'profile', str(tmp_path))
+    monkeypatch.setitem(global_vars, 'profile_stats', None)
+    game = Game(state)
+    _, action = profileSearch(game)
+    assert action in getLegalActions(state)
+    assert (tmp_path / "move001_player1.pstats").exists()
+    assert global_vars['profile_stats'].total_calls > 0
+
+    # Every search gets its own file, whichever player moves
+    game.play(action)
+    profileSearch(game)
+    assert (tmp_path / "move002_player2.pstats").exists()
+
+def test_game():
+    game = Game(parseStateString("3 1 W 1 1 4 4 2 4 E"))
+    assert game.turn == 1
+    assert len(game.legal_moves()) == 65
+    assert game.result() is None
+    with pytest.raises(ValueError):
+        game.play(((0, 0), 'N', None, None))
+    for depth in (0, -1):
+        with pytest.raises(ValueError):
+            game.best_move(depth=depth)
+
+    rng = random.Random(1)
+    while game.result() is None and len(game.history) < 40:
+        if game.turn == 1:
+            _, move = game.best_move(depth=2)
+        else:
+            move = rng.choice(sorted(game.legal_moves(), key=str))
+        game.play(move)
+    assert game.result() == 1
+    assert game.legal_moves() == set()
+
+def test_game_best_move_when_lost():
+    game = Game(parseStateString("1 1 E 3 4 2 4 2 2 S"))
+    tt_clear()
+    score, move = game.best_move(depth=2)
+    assert score == float('-inf')
+    assert move in game.legal_moves()
+
+def test_selfplay():
+    results = list(selfplay(4, workers=2, depths=(2, 1), random_fraction=0.5, seed=1, max_moves=20))
+    assert sorted(result['game'] for result in results) == [0, 1, 2, 3]
+    for result in results:
+        assert result['winner'] in (1, 2, None)
+        assert 0 < result['length'] <= 20
+        assert len(result['move_times']) == len(result['nodes']) == result['length']
+        if result['winner'] is None:
+            assert result['length'] == 20
+    again = list(selfplay(4, workers=2, depths=(2, 1), random_fraction=0.5, seed=1, max_moves=20))
+    assert sorted((result['game'], result['seed'], result['random_player2']) for result in results) == \
+           sorted((result['game'], result['seed'], result['random_player2']) for result in again)
+
+@pytest.mark.parametrize("state_string, turn, depth", [
+    ("3 1 W 1 1 4 4 2 4 E", 1, 3),
+    ("4 1 S 1 1 4 4 2 4 E", 2, 4),
+    ("1 1 E 3 4 2 4 2 2 S", 1, 2),
+])
+def test_parallel_minimax(monkeypatch, state_string, turn, depth):
+    state = parseStateString(state_string)
+    state['turn'] = turn
+    tt_clear()
+    expected, _ = minimax(copy.deepcopy(state), None, depth, float('-inf'), float('inf'), turn == 1)
+
+    monkeypatch.setitem(global_vars, 'threads', 2)
+    monkeypatch.setitem(global_vars, 'search_pool', None)
+    score, action = parallel_minimax(copy.deepcopy(state), depth, turn == 1)
+    global_vars['search_pool'].shutdown()
+    tt_unshare(unlink=True)
+    assert score == expected
+    if abs(score) != float('inf') or (score == float('inf')) == (turn == 1):
+        assert action in getLegalActions(state)
+
+@pytest.mark.parametrize("score", [float('-inf'), -91, 0, 65, float('inf')])
+def test_tt_pack(score):
+    state = parseStateString("3 1 W 1 1 4 4 2 4 E")
+    for action in list(getLegalActions(state)) + [None]:
+        assert tt_unpack(tt_pack(5, TT_LOWER, score, action, 2, 15)) == (5, TT_LOWER, score, action, 2, 15)
+
+def test_shared_transposition_table():
+    tt_share()
+    try:
+        action = ((0, 1), 'E', (0, 0), (1, 0))
+        tt_store(12345, 3, TT_EXACT, -7, action, 1)
+        assert tt_probe(12345) == (12345, 3, TT_EXACT, -7, action, 1, global_vars['tt_age'])
+        assert tt_probe(54321) is None
+
+        # A slot with a mismatched half, as if another process was writing it, reads as empty
+        table = global_vars['tt']
+        i = 12345 % (len(table) // 4) * 4
+        table[i + 1] ^= 1 << 40
+        assert tt_probe(12345) is None
+
+        tt_clear()
+        assert not any(global_vars['tt'])
+    finally:
+        tt_unshare(unlink=True)
+    assert global_vars['tt_shared'] is None
+    assert tt_probe(12345) is None
+
+def test_shared_transposition_table_aging(monkeypatch):
+    # Selfplay workers each bump their own age, so another worker's deep entry must not look stale
+    tt_share()
+    try:
+        buckets = len(global_vars['tt']) // 4
+        monkeypatch.setitem(global_vars, 'tt_aging', False)
+        monkeypatch.setitem(global_vars, 'tt_age', 3)
+        tt_store(7, 5, TT_EXACT, 1, None, 1)
+        monkeypatch.setitem(global_vars, 'tt_age', 4)
+        tt_store(7 + buckets, 1, TT_EXACT, 2, None, 1)
+        tt_store(7 + 2 * buckets, 1, TT_EXACT, 3, None, 1)
+        assert tt_probe(7) is not None
+
+        # With aging the deep entry from an earlier move is replaced
+        monkeypatch.setitem(global_vars, 'tt_aging', True)
+        tt_store(7 + 3 * buckets, 1, TT_EXACT, 4, None, 1)
+        assert tt_probe(7) is None
+    finally:
+        tt_unshare(unlink=True)
+    assert global_vars['tt_shared'] is None
+    assert tt_probe(12345) is None
+
+def test_cache_file(monkeypatch, tmp_path):
+    state = parseStateString("3 1 W 1 1 4 4 2 4 E")
+    monkeypatch.setitem(global_vars, 'cache_file', str(tmp_path / "test.cache"))
+    monkeypatch.setitem(global_vars, 'cache_db', None)
+    monkeypatch.setitem(global_vars, 'cache_batch', 16)
+    monkeypatch.setitem(global_vars, 'movetime', None)
+    tt_clear()
+    try:
+        score, action = findBestAction(state, True, depth=4)
+        # Results are written out in batches rather than kept in memory
+        assert len(global_vars['cache_pending']) < 16
+        cache_flush()
+        assert cache_flush() == 0
+        cache_close()
+
+        # A new run finds the root in the file and searches nothing
+        tt_clear()
+        cache_load()
+        key = min(zobrist_hashes(state_to_bitboard(state)))
+        assert cache_probe(key)[1] == 4
+        monkeypatch.setitem(global_vars, 'nodes_evaluated', 0)
+        assert findBestAction(state, True, depth=4) == (score, action)
+        assert global_vars['nodes_evaluated'] == 0
+    finally:
+        cache_close()
+
+def test_cache_file_version(monkeypatch, tmp_path):
+    path = tmp_path / "old.cache"
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA user_version = 999")
+    connection.execute("CREATE TABLE positions (key INTEGER PRIMARY KEY, entry INTEGER NOT NULL)")
+    connection.close()
+    monkeypatch.setitem(global_vars, 'cache_file', str(path))
+    monkeypatch.setitem(global_vars, 'cache_db', None)
+    with pytest.raises(ValueError):
+        cache_load()
+    assert global_vars['cache_db'] is None
+
+def test_opening_book(monkeypatch, tmp_path):
+    initial = parseStateString("3 1 W 1 1 4 4 2 4 E")
+    book = buildBook(2, 2, workers=1)
+    write_book(tmp_path / "test.book", book)
+    monkeypatch.setitem(global_vars, 'book', None)
+    load_book(tmp_path / "test.book")
+    assert global_vars['book'] == book
+
+    tt_clear()
+    score, _ = minimax(copy.deepcopy(initial), None, 2, float('-inf'), float('inf'), True)
+    assert book_move(initial)[0] == score
+    assert findBestAction(initial, True) == book_move(initial)
+
+    # Every reply to every first move is in the book, in any of its symmetric forms
+    bb = state_to_bitboard(initial)
+    for sym in range(8):
+        image = [transform_mask(bb[0], sym), transform_mask(bb[1], sym), transform_mask(bb[2], sym), bb[3]]
+        assert book_move(image)[1] in bb_getLegalActions(image)
+    for action in getLegalActions(initial):
+        child = apply_action(initial, action)
+        move = book_move(child)
+        assert move is None or move[1] in getLegalActions(child)
+
+    with open(tmp_path / "bad.book", 'wb') as f:
+        f.write(b'nope')
+    with pytest.raises(ValueError):
+        load_book(tmp_path / "bad.book")
+
+@pytest.mark.parametrize("value", ["abc", "0", "-5"])
+def test_positive_flag_value(monkeypatch, value):
+    monkeypatch.setattr(sys, 'argv', ["L-Game.py", "--movetime", "250"])
+    assert getPositiveFlagValue("--movetime", 1000) == 250
+    monkeypatch.setattr(sys, 'argv', ["L-Game.py", "--movetime"])
+    assert getPositiveFlagValue("--movetime", 1000) == 1000
+    monkeypatch.setattr(sys, 'argv', ["L-Game.py", "--movetime", value])
+    with pytest.raises(SystemExit):
+        getPositiveFlagValue("--movetime", 1000)
+
 @pytest.mark.skip(reason="Test not writted yet")
 def test_buildBoard():
     assert 1 + 1 == 3
@@ -125,4 +601,39 @@ def test_get_secondary_orientation(orientation, position, expected, should_succe
     if (should_succeed):
         assert result == expected
     else:
-        assert result != expected
\ No newline at end of file
+        assert result != expected
+
+@pytest.fixture(scope="module")
+def tablebase():
+    return solve()
+
+def test_tablebase(tablebase, state, monkeypatch):
+    monkeypatch.setitem(global_vars, 'tablebase', tablebase)
+
+    # The initial position is a draw with perfect play
+    initial = {
+        'player1': {'position': (2, 0), 'orientation': 'W'},
+        'player2': {'position': (1, 3), 'orientation': 'E'},
+        'neutral': [(0, 0), (3, 3)],
+        'turn': 1,
+        'bypass_player': None,
+    }
+    assert tablebase_lookup(state_to_bitboard(initial)) == ('draw', None)
+
+    # minimax finds a forced win for player 2 here, the tablebase wins in 1
+    assert tablebase_lookup(state_to_bitboard(state)) == ('win', 1)
+    result, action = tablebase_best_action(state)
+    assert result == 'win'
+    assert getLegalActions(apply_action(state, action)) == set()
+
+def test_load_tablebase(tablebase, state, tmp_path, monkeypatch):
+    monkeypatch.setitem(global_vars, 'tablebase', None)
+    path = tmp_path / "L-Game.tb"
+    write_tablebase(path, tablebase)
+
+    load_tablebase(path)
+    assert bytes(global_vars['tablebase']) == bytes(tablebase)
+    assert tablebase_lookup(state_to_bitboard(state)) == ('win', 1)
+
+    close_tablebase()
+    assert global_vars['tablebase'] is None